@@ -0,0 +1,63 @@
+"""
+Measure how resolving the explicit GroupPin names scales with the number of annotated pins.
+The time per pin should stay the same.
+
+Run from the repository root:
+python3 -m benchmarks.bench_explicit_pin_names
+"""
+
+import time
+
+from common_types.group_types import GroupPath, GroupType, Schematic
+from kicad_group_netlister.kicad_group_netlister import (
+    GROUP_PIN_FIELD_PREFIX,
+    _get_explicit_pin_name_lookups,
+)
+from kicad_group_netlister.kicad_types import (
+    KiCadComponent,
+    KiCadComponentRef,
+    KiCadSheetPath,
+    RawGroup,
+    RawGroupLookup,
+)
+
+PIN_COUNTS = [1_000, 10_000, 100_000]
+PINS_PER_GROUP = 16
+
+
+def _make_raw_groups(pins: int) -> RawGroupLookup:
+    """
+    Create groups with one component each that names all its pins explicitly.
+    """
+    groups = RawGroupLookup(dict())
+    for group_index in range(pins // PINS_PER_GROUP):
+        component = KiCadComponent()
+        component.ref = KiCadComponentRef(f"U{group_index}")
+        component.sheetpath = KiCadSheetPath(f"/Sheet{group_index}/")
+        component.fields = {
+            f"{GROUP_PIN_FIELD_PREFIX}{pin}": f"P{pin}"
+            for pin in range(1, PINS_PER_GROUP + 1)
+        }
+
+        raw_group = RawGroup()
+        raw_group.schematic = Schematic("Board")
+        raw_group.path = GroupPath(f"/Sheet{group_index}")
+        raw_group.group_type = GroupType("Device")
+        raw_group.group_map_fields = dict()
+        raw_group.components = {component}
+        groups[raw_group.get_id()] = raw_group
+    return groups
+
+
+def main() -> None:
+    print(f"{'pins':>8} {'seconds':>8} {'us/pin':>7}")
+    for pins in PIN_COUNTS:
+        raw_groups = _make_raw_groups(pins)
+        start = time.perf_counter()
+        _get_explicit_pin_name_lookups(raw_groups, False)
+        seconds = time.perf_counter() - start
+        print(f"{pins:8} {seconds:8.3f} {seconds / pins * 1e6:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Measure how merging and connecting Group Netlists scales with the number of boards and pins.
+Every board has a connector and all connectors are connected together.
+
+Run from the repository root:
+python3 -m benchmarks.bench_group_netlist_merger
+"""
+
+import contextlib
+import io
+import time
+
+from benchmarks.synthetic_design import make_group_netlist
+from common_types.group_types import compile_group_glob
+from group_netlist_merger.group_netlist_merger import (
+    PinMapper,
+    _connect_netlist,
+    _merge_group_netlists,
+)
+
+BOARD_COUNTS = [2, 4, 8, 16]
+PIN_COUNTS = [64, 256, 1024]
+GROUPS_PER_BOARD = 10
+
+
+def main() -> None:
+    connect_group_glob = compile_group_glob("*/Connector")
+    print(f"{'boards':>7} {'pins':>6} {'nets':>8} {'mapper':>9} {'connect s':>10}")
+    for pins in PIN_COUNTS:
+        for boards in BOARD_COUNTS:
+            for pin_mapper in PinMapper:
+                netlist = _merge_group_netlists({
+                    make_group_netlist(f"Board{board}", GROUPS_PER_BOARD, pins)
+                    for board in range(boards)
+                })
+                nets = len(netlist.nets)
+                start = time.perf_counter()
+                # The merger reports what it merges on stderr.
+                with contextlib.redirect_stderr(io.StringIO()):
+                    _connect_netlist(netlist, {connect_group_glob}, pin_mapper)
+                seconds = time.perf_counter() - start
+                print(
+                    f"{boards:7} {pins:6} {nets:8} {str(pin_mapper):>9} {seconds:10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure how many bytes the in-memory Group Netlist needs per pin reference, i.e., per node in a net.
+
+Run from the repository root:
+python3 -m benchmarks.bench_memory
+"""
+
+import contextlib
+import io
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic_design import write_kicad_netlist
+from common_types.group_types import connect_netlist
+from common_types.parse_xml import VerifyPolicy, parse_group_netlist
+from kicad_group_netlister.kicad_group_netlister import create_group_netlist_from_kicad
+from kicad_group_netlister.kicad_netlist_xml import parse_kicad_netlist
+
+SHEETS = 100
+GROUPS_PER_SHEET = 20
+PINS_PER_GROUP = 16
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        kicad_netlist_path = Path(tmp_dir) / "kicad_netlist.xml"
+        group_netlist_path = Path(tmp_dir) / "group_netlist.xml"
+        write_kicad_netlist(
+            kicad_netlist_path, SHEETS, GROUPS_PER_SHEET, PINS_PER_GROUP
+        )
+        # The netlister reports where it writes to on stdout.
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_group_netlist_from_kicad(
+                kicad_netlist_path, False, group_netlist_path
+            )
+
+        tracemalloc.start()
+        kicad_netlist = parse_kicad_netlist(kicad_netlist_path, False)
+        kicad_bytes = tracemalloc.get_traced_memory()[0]
+        kicad_pins = sum(len(net) for net in kicad_netlist.nets)
+        del kicad_netlist
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        netlist = parse_group_netlist(group_netlist_path, VerifyPolicy.off)
+        netlist_bytes = tracemalloc.get_traced_memory()[0]
+        connected_netlist = connect_netlist(netlist)
+        # The connections are only computed when accessed.
+        for group in connected_netlist.groups.values():
+            _ = group.pins
+        connected_bytes = tracemalloc.get_traced_memory()[0] - netlist_bytes
+        pins = sum(len(net) for net in netlist.nets)
+        del netlist, connected_netlist
+        tracemalloc.stop()
+
+    print(f"{'structure':>20} {'pins':>8} {'MiB':>8} {'bytes/pin':>10}")
+    for name, count, size in [
+        ("KiCadNetlist", kicad_pins, kicad_bytes),
+        ("GroupNetlist", pins, netlist_bytes),
+        ("connections", pins, connected_bytes),
+    ]:
+        print(f"{name:>20} {count:8} {size / 2**20:8.1f} {size / count:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure time and peak RSS of parse_kicad_netlist against the size of the KiCad Netlist.
+Every measurement runs in a fresh interpreter because the peak RSS of a process never decreases.
+
+Run from the repository root:
+python3 -m benchmarks.bench_parse_kicad_netlist
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from benchmarks.synthetic_design import write_kicad_netlist
+from kicad_group_netlister.kicad_netlist_xml import parse_kicad_netlist
+
+SHEET_COUNTS = [10, 40, 160, 640]
+GROUPS_PER_SHEET = 20
+PINS_PER_GROUP = 16
+
+
+def _measure(mode: str, netlist_path: Path) -> None:
+    start = time.perf_counter()
+    match mode:
+        case "stream":
+            parse_kicad_netlist(netlist_path, lenient_names=False)
+        case "dom":
+            # Only for reference: what loading the whole tree costs.
+            ET.parse(netlist_path)
+    seconds = time.perf_counter() - start
+    # Linux reports KiB.
+    peak_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": seconds, "peak_rss_mib": peak_rss_mib}))
+
+
+def _run_child(mode: str, netlist_path: Path) -> dict[str, float]:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_parse_kicad_netlist",
+            "--child",
+            mode,
+            str(netlist_path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "NETLIST"))
+    args = parser.parse_args()
+    if args.child is not None:
+        _measure(args.child[0], Path(args.child[1]))
+        return
+
+    print(
+        f"{'file MiB':>10} {'parse s':>10} {'parse RSS MiB':>14} {'ET.parse RSS MiB':>17}"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for sheets in SHEET_COUNTS:
+            netlist_path = Path(tmp_dir) / f"netlist_{sheets}.xml"
+            write_kicad_netlist(netlist_path, sheets, GROUPS_PER_SHEET, PINS_PER_GROUP)
+            size_mib = netlist_path.stat().st_size / 2**20
+            stream = _run_child("stream", netlist_path)
+            dom = _run_child("dom", netlist_path)
+            print(
+                f"{size_mib:10.1f} {stream['seconds']:10.2f} "
+                f"{stream['peak_rss_mib']:14.1f} {dom['peak_rss_mib']:17.1f}"
+            )
+            netlist_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
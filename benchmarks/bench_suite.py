@@ -0,0 +1,196 @@
+"""
+Measure time and peak RSS of all four tools against the size of the design.
+Every measurement runs in a fresh interpreter because the peak RSS of a process never decreases.
+Each measurement is printed as one JSON object per line so that the results of two runs can be compared.
+
+Run from the repository root:
+python3 -m benchmarks.bench_suite > results.jsonl
+python3 -m benchmarks.bench_suite --baseline results.jsonl
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from benchmarks.synthetic_design import write_kicad_netlist
+from code_gen.code_gen import generate_code
+from common_types.group_types import compile_group_glob
+from group_netlist_merger.group_netlist_merger import PinMapper, merge_group_netlists
+from kicad_group_netlister.kicad_group_netlister import create_group_netlist_from_kicad
+from netlist_to_csv.netlist_to_csv import create_csv_from_netlist
+
+SHEET_COUNTS = [10, 40, 160]
+GROUPS_PER_SHEET = 20
+PINS_PER_GROUP = 16
+FAN_OUT = 2
+POWER_NET_SIZE = 64
+"""
+The merger merges this many copies of the design.
+"""
+BOARDS = 2
+TOOLS = ["kicad_group_netlister", "group_netlist_merger", "code_gen", "netlist_to_csv"]
+EXAMPLE_TEMPLATE = Path(__file__).parent.parent / "example" / "template.jinja2"
+
+
+def _run_tool(tool: str, work_dir: Path) -> None:
+    kicad_netlist_path = work_dir / "kicad_netlist_0.xml"
+    group_netlist_path = work_dir / "group_netlist_0.xml"
+    match tool:
+        case "kicad_group_netlister":
+            create_group_netlist_from_kicad(
+                kicad_netlist_path, False, group_netlist_path
+            )
+        case "group_netlist_merger":
+            merge_group_netlists(
+                PinMapper.equal,
+                {compile_group_glob("*/Type0")},
+                work_dir / "merged.xml",
+                {work_dir / f"group_netlist_{board}.xml" for board in range(BOARDS)},
+            )
+        case "code_gen":
+            generate_code(
+                group_netlist_path, EXAMPLE_TEMPLATE, None, work_dir / "pindefs.h"
+            )
+        case "netlist_to_csv":
+            create_csv_from_netlist(
+                group_netlist_path,
+                compile_group_glob("**/Type0"),
+                set(),
+                work_dir / "netlist.csv",
+            )
+
+
+def _measure(tool: str, work_dir: Path) -> None:
+    start = time.perf_counter()
+    # stdout is reserved for the measurement.
+    with contextlib.redirect_stdout(sys.stderr):
+        _run_tool(tool, work_dir)
+    seconds = time.perf_counter() - start
+    # Linux reports KiB.
+    peak_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": seconds, "peak_rss_mib": peak_rss_mib}))
+
+
+def _run_child(tool: str, work_dir: Path) -> Dict[str, float]:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_suite",
+            "--child",
+            tool,
+            str(work_dir),
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def _prepare(work_dir: Path, sheets: int) -> None:
+    """
+    Write the KiCad Netlists of all boards and the Group Netlists of all boards but the first.
+    The first Group Netlist is written by the measured kicad_group_netlister run.
+    """
+    for board in range(BOARDS):
+        kicad_netlist_path = work_dir / f"kicad_netlist_{board}.xml"
+        write_kicad_netlist(
+            kicad_netlist_path,
+            sheets,
+            GROUPS_PER_SHEET,
+            PINS_PER_GROUP,
+            FAN_OUT,
+            POWER_NET_SIZE,
+            f"Board{board}",
+        )
+        if board != 0:
+            # Only the measurements are of interest.
+            with (
+                contextlib.redirect_stdout(io.StringIO()),
+                contextlib.redirect_stderr(io.StringIO()),
+            ):
+                create_group_netlist_from_kicad(
+                    kicad_netlist_path, False, work_dir / f"group_netlist_{board}.xml"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", nargs=2, metavar=("TOOL", "WORK_DIR"))
+    parser.add_argument(
+        "--sheets",
+        type=int,
+        nargs="+",
+        default=SHEET_COUNTS,
+        help="The design sizes to measure as number of sheets.",
+    )
+    parser.add_argument(
+        "--tools",
+        nargs="+",
+        choices=TOOLS,
+        default=TOOLS,
+        help="The tools to measure. The kicad_group_netlister creates the inputs of the others and always runs first.",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="The output of an earlier run. Add how the measurements compare to it.",
+    )
+    args = parser.parse_args()
+    if args.child is not None:
+        _measure(args.child[0], Path(args.child[1]))
+        return
+
+    baseline: Dict[Tuple[str, int], Dict[str, Any]] = dict()
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            for line in baseline_file:
+                old_result = json.loads(line)
+                baseline[(old_result["tool"], old_result["sheets"])] = old_result
+
+    for sheets in args.sheets:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            work_dir = Path(tmp_dir)
+            _prepare(work_dir, sheets)
+            # The other tools need the output of the kicad_group_netlister.
+            for tool in ["kicad_group_netlister"] + [
+                tool for tool in args.tools if tool != "kicad_group_netlister"
+            ]:
+                measurement = _run_child(tool, work_dir)
+                if tool not in args.tools:
+                    continue
+                kicad_netlist_size = (work_dir / "kicad_netlist_0.xml").stat().st_size
+                group_netlist_size = (work_dir / "group_netlist_0.xml").stat().st_size
+                result: Dict[str, Any] = {
+                    "tool": tool,
+                    "sheets": sheets,
+                    "groups_per_sheet": GROUPS_PER_SHEET,
+                    "pins_per_group": PINS_PER_GROUP,
+                    "fan_out": FAN_OUT,
+                    "power_net_size": POWER_NET_SIZE,
+                    "kicad_netlist_mib": kicad_netlist_size / 2**20,
+                    "group_netlist_mib": group_netlist_size / 2**20,
+                    **measurement,
+                }
+                if (tool, sheets) in baseline:
+                    old_result = baseline[(tool, sheets)]
+                    result["seconds_vs_baseline"] = (
+                        result["seconds"] / old_result["seconds"]
+                    )
+                    result["peak_rss_vs_baseline"] = (
+                        result["peak_rss_mib"] / old_result["peak_rss_mib"]
+                    )
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
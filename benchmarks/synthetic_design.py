@@ -0,0 +1,194 @@
+"""
+Generate deterministic, synthetic designs of arbitrary size for the benchmarks.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import List, TextIO, Tuple
+from xml.sax.saxutils import quoteattr
+
+from common_types.group_types import (
+    GlobalGroupPinIdentifier,
+    Group,
+    GroupIdentifier,
+    GroupNet,
+    GroupNetlist,
+    GroupPath,
+    GroupPinName,
+    GroupType,
+    Schematic,
+)
+
+
+POWER_PIN_NAME = "GND"
+
+
+def _write_kicad_component(
+    file: TextIO,
+    ref: str,
+    sheet_path: str,
+    group_type: str,
+    pins_per_group: int,
+    power_pin: bool,
+) -> None:
+    file.write(f"    <comp ref={quoteattr(ref)}>\n")
+    file.write("      <value>Group_IO</value>\n")
+    file.write("      <fields>\n")
+    file.write(f'        <field name="GroupType">{group_type}</field>\n')
+    for pin in range(1, pins_per_group + 1):
+        file.write(f'        <field name="GroupPin{pin}">P{pin}</field>\n')
+    if power_pin:
+        file.write(
+            f'        <field name="GroupPin{pins_per_group + 1}">{POWER_PIN_NAME}</field>\n'
+        )
+    file.write('        <field name="Datasheet"/>\n')
+    file.write("      </fields>\n")
+    file.write(f'      <sheetpath names={quoteattr(sheet_path)} tstamps="/"/>\n')
+    file.write("    </comp>\n")
+
+
+def _write_kicad_net(
+    file: TextIO, code: int, name: str, nodes: List[Tuple[str, int, str]]
+) -> None:
+    file.write(f'    <net code="{code}" name={quoteattr(name)} class="Default">\n')
+    for ref, pin, pinfunction in nodes:
+        file.write(
+            f'      <node ref="{ref}" pin="{pin}" pinfunction={quoteattr(pinfunction)} pintype="passive"/>\n'
+        )
+    file.write("    </net>\n")
+
+
+def write_kicad_netlist(
+    path: Path,
+    sheets: int,
+    groups_per_sheet: int,
+    pins_per_group: int,
+    fan_out: int = 2,
+    power_net_size: int = 0,
+    schematic: str = "synthetic",
+) -> None:
+    """
+    Write a KiCad Netlist (kicadxml) with one root sheet and `sheets` sub sheets.
+    Every sheet has `groups_per_sheet` groups of a single component each.
+    The groups on a sheet are split into runs of `fan_out` groups and pin n of all groups in a run is connected.
+    When `power_net_size` is positive, every component gets an additional GND pin.
+    All GND pins are connected in power nets of `power_net_size` pins each, crossing sheet boundaries.
+    The schematic is called `schematic`.
+    """
+    assert fan_out >= 1
+    sheet_paths = ["/"] + [f"/Sheet{sheet}/" for sheet in range(sheets)]
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        file.write('<export version="E">\n')
+        file.write("  <design>\n")
+        file.write(f"    <source>/synthetic/{schematic}.kicad_sch</source>\n")
+        file.write("    <date>2026-01-01T00:00:00+0000</date>\n")
+        file.write("    <tool>synthetic_design</tool>\n")
+        for number, sheet_path in enumerate(sheet_paths):
+            file.write(
+                f'    <sheet number="{number + 1}" name={quoteattr(sheet_path)} tstamps="/">\n'
+            )
+            file.write("      <title_block>\n")
+            file.write(f"        <source>{schematic}.kicad_sch</source>\n")
+            file.write("      </title_block>\n")
+            file.write("    </sheet>\n")
+        file.write("  </design>\n")
+
+        refs: List[str] = list()
+        file.write("  <components>\n")
+        for sheet, sheet_path in enumerate(sheet_paths):
+            for group in range(groups_per_sheet):
+                ref = f"U{sheet}_{group}"
+                refs.append(ref)
+                _write_kicad_component(
+                    file,
+                    ref,
+                    sheet_path,
+                    f"Type{group}",
+                    pins_per_group,
+                    power_net_size > 0,
+                )
+        file.write("  </components>\n")
+
+        file.write("  <nets>\n")
+        code = 1
+        for sheet in range(len(sheet_paths)):
+            for group in range(0, groups_per_sheet - fan_out + 1, fan_out):
+                for pin in range(1, pins_per_group + 1):
+                    _write_kicad_net(
+                        file,
+                        code,
+                        f"/Net{code}",
+                        [
+                            (f"U{sheet}_{other_group}", pin, f"F{pin}")
+                            for other_group in range(group, group + fan_out)
+                        ],
+                    )
+                    code += 1
+        if power_net_size > 0:
+            for power_net, start in enumerate(range(0, len(refs), power_net_size)):
+                _write_kicad_net(
+                    file,
+                    code,
+                    f"/{POWER_PIN_NAME}{power_net}",
+                    [
+                        (ref, pins_per_group + 1, POWER_PIN_NAME)
+                        for ref in refs[start : start + power_net_size]
+                    ],
+                )
+                code += 1
+        file.write("  </nets>\n")
+        file.write("</export>\n")
+
+
+def make_group_netlist(
+    schematic: str, groups: int, pins_per_group: int
+) -> GroupNetlist:
+    """
+    Build a Group Netlist with a `Connector` group on the root sheet and `groups` further groups on their own sheets.
+    All pins are numbered from 1 to `pins_per_group`.
+    Pin n of the connector is connected to pin n of group n modulo `groups`, all other pins are unconnected.
+    """
+    netlist = GroupNetlist()
+    netlist.sources = {Path(f"/synthetic/{schematic}.kicad_sch")}
+    netlist.date = datetime(2026, 1, 1)
+    netlist.tool = "synthetic_design"
+    netlist.groups = dict()
+    netlist.nets = set()
+
+    pins = {GroupPinName(str(pin)) for pin in range(1, pins_per_group + 1)}
+    group_ids = [
+        GroupIdentifier(Schematic(schematic), GroupPath("/"), GroupType("Connector"))
+    ] + [
+        GroupIdentifier(
+            Schematic(schematic), GroupPath(f"/Sheet{group}/"), GroupType("Device")
+        )
+        for group in range(groups)
+    ]
+    for group_id in group_ids:
+        group = Group()
+        group.schematic = group_id.schematic
+        group.path = group_id.path
+        group.group_type = group_id.group_type
+        group.group_map_fields = dict()
+        group.pins = set(pins)
+        netlist.groups[group_id] = group
+
+    connector_id = group_ids[0]
+    for pin_number in range(1, pins_per_group + 1):
+        pin = GroupPinName(str(pin_number))
+        connected_id = group_ids[1 + pin_number % groups]
+        netlist.nets.add(
+            GroupNet(
+                frozenset({
+                    GlobalGroupPinIdentifier(connector_id, pin),
+                    GlobalGroupPinIdentifier(connected_id, pin),
+                })
+            )
+        )
+        for group_id in group_ids[1:]:
+            if group_id != connected_id:
+                netlist.nets.add(
+                    GroupNet(frozenset({GlobalGroupPinIdentifier(group_id, pin)}))
+                )
+    return netlist
@@ -1,19 +1,51 @@
 import argparse
+import json
+import multiprocessing
 import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple
 
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import (
+    BaseLoader,
+    BytecodeCache,
+    ChoiceLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    ModuleLoader,
+    StrictUndefined,
+)
 
 from common_types.group_types import (
+    GroupNetlistWithConnections,
+    GroupPathIndex,
     GroupWithConnection,
     compile_group_glob,
     connect_netlist,
-    does_match_pattern,
     get_parent_group_path,
     stringify_group_id,
 )
-from common_types.parse_xml import parse_group_netlist
+from common_types.instrumentation import (
+    PROFILE_HELP,
+    PROFILE_MEMORY_HELP,
+    STATS_JSON_HELP,
+    count_netlist,
+    enable_instrumentation,
+    increment_count,
+    report_instrumentation,
+    span,
+)
+from common_types.output_file import write_text_if_changed
+from common_types.parse_xml import (
+    PARSE_CACHE_DIR_HELP,
+    PARSE_CACHE_HELP,
+    VERIFY_POLICY_HELP,
+    VerifyPolicy,
+    parse_group_netlist,
+)
 
 TOOL_NAME = "code_gen v0.1.0"
 TOOL_NAME_WITH_VERSION = f"{TOOL_NAME} v0.1.0"
@@ -42,11 +74,152 @@ def _camel_case(in_str: str) -> str:
     return _change_case(in_str, False)
 
 
+class RenderJob(NamedTuple):
+    template_path: Path
+    output_path: Path
+
+
+class PoolKind(Enum):
+    thread = "thread"
+    process = "process"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+def _get_template_name(template_path: Path, template_env_path: Path) -> str:
+    if not template_path.is_relative_to(template_env_path):
+        print(
+            "Error: The template path is not a subpath of the template environment path.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    return str(template_path.relative_to(template_env_path))
+
+
+class _RecordingFileSystemLoader(FileSystemLoader):
+    """
+    A FileSystemLoader that remembers the files of all templates it loaded, including included ones.
+    """
+
+    """
+    The paths in the order they were first loaded in.
+    A dict is used as ordered set.
+    """
+    loaded_paths: Dict[str, None]
+
+    def __init__(self, searchpath: Path) -> None:
+        super().__init__(searchpath, followlinks=True)
+        self.loaded_paths = dict()
+
+    def get_source(
+        self, environment: Environment, template: str
+    ) -> Tuple[str, str, Callable[[], bool]]:
+        source, filename, uptodate = super().get_source(environment, template)
+        self.loaded_paths[filename] = None
+        return source, filename, uptodate
+
+
+def create_environment(
+    template_env_path: Path,
+    bytecode_cache_dir: Path | None = None,
+    precompiled_templates_path: Path | None = None,
+) -> Environment:
+    """
+    Create the Jinja2 environment for the templates in `template_env_path`.
+    Compiled templates are stored in and loaded from `bytecode_cache_dir` if provided.
+    Templates in the archive at `precompiled_templates_path` are loaded from there without looking at their source.
+    """
+    loader: BaseLoader = _RecordingFileSystemLoader(template_env_path)
+    if precompiled_templates_path is not None:
+        # Templates that aren't in the archive are still loaded from their source.
+        loader = ChoiceLoader([ModuleLoader(precompiled_templates_path), loader])
+
+    bytecode_cache: BytecodeCache | None = None
+    if bytecode_cache_dir is not None:
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+    return Environment(
+        loader=loader,
+        bytecode_cache=bytecode_cache,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        undefined=StrictUndefined,
+    )
+
+
+def _create_render_context(netlist: GroupNetlistWithConnections) -> Dict[str, Any]:
+    """
+    Return everything a template has access to.
+    """
+    group_index = GroupPathIndex(netlist.groups)
+
+    def glob_groups(glob_str: str) -> List[GroupWithConnection]:
+        increment_count("glob_groups calls")
+        group_ids = group_index.glob(compile_group_glob(glob_str))
+        return [netlist.groups[group_id] for group_id in group_ids]
+
+    return {
+        "netlist": netlist,
+        "glob_groups": glob_groups,
+        "stringify_group_id": stringify_group_id,
+        "pascal_case": _pascal_case,
+        "camel_case": _camel_case,
+        "get_parent_group_path": get_parent_group_path,
+    }
+
+
+def _get_loaded_template_paths(env: Environment) -> List[str]:
+    """
+    Return the files of all templates the environment has loaded from their source so far.
+    """
+    loaders = (
+        env.loader.loaders if isinstance(env.loader, ChoiceLoader) else [env.loader]
+    )
+    return [
+        path
+        for loader in loaders
+        if isinstance(loader, _RecordingFileSystemLoader)
+        for path in loader.loaded_paths
+    ]
+
+
+def _escape_depfile_path(path: str) -> str:
+    # Both Make and Ninja understand this escaping.
+    return path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+
+def _write_depfile(depfile_path: Path, target: Path, dependencies: List[str]) -> None:
+    """
+    Write a Make dependency file, which Ninja reads as well.
+    """
+    with open(depfile_path, "w") as depfile:
+        depfile.write(f"{_escape_depfile_path(str(target))}:")
+        for dependency in dependencies:
+            depfile.write(f" \\\n  {_escape_depfile_path(dependency)}")
+        depfile.write("\n")
+
+
+def _write_output(output: str, output_path: Path | None) -> None:
+    if output_path is not None:
+        print(f"Printing output to: {output_path}")
+        write_text_if_changed(output_path, output)
+    else:
+        print(output)
+
+
 def generate_code(
     netlist_path: Path,
     template_path: Path,
     template_dir_env: Path | None,
     output_path: Path | None,
+    verify: VerifyPolicy = VerifyPolicy.hash,
+    parse_cache: bool = False,
+    parse_cache_dir: Path | None = None,
+    bytecode_cache_dir: Path | None = None,
+    precompiled_templates_path: Path | None = None,
+    depfile_path: Path | None = None,
 ) -> None:
     """
     This function does the same and has the same parameters as the code_gen CLI interface.
@@ -54,50 +227,232 @@ def generate_code(
     template_env_path = (
         template_dir_env if template_dir_env is not None else template_path.parent
     )
-    if not template_path.is_relative_to(template_env_path):
+    template_name = _get_template_name(template_path, template_env_path)
+
+    with span("parse"):
+        group_netlist = parse_group_netlist(
+            netlist_path, verify, parse_cache, parse_cache_dir
+        )
+    count_netlist(group_netlist.groups, group_netlist.nets)
+    with span("connect"):
+        netlist = connect_netlist(group_netlist)
+
+    with span("load template"):
+        env = create_environment(
+            template_env_path, bytecode_cache_dir, precompiled_templates_path
+        )
+        template = env.get_template(template_name)
+    with span("render"):
+        output = template.render(_create_render_context(netlist))
+    with span("write"):
+        _write_output(output, output_path)
+        if depfile_path is not None:
+            assert output_path is not None
+            # Templates in the archive aren't loaded from their source, so depend on the archive instead.
+            _write_depfile(
+                depfile_path,
+                output_path,
+                [str(netlist_path)]
+                + (
+                    []
+                    if precompiled_templates_path is None
+                    else [str(precompiled_templates_path)]
+                )
+                + _get_loaded_template_paths(env),
+            )
+
+
+def read_manifest(manifest_path: Path) -> List[RenderJob]:
+    """
+    A manifest is a JSON list of objects with a `template` and an `output` path.
+    Relative paths are relative to the manifest's directory.
+    """
+    with open(manifest_path) as manifest_file:
+        try:
+            raw_jobs = json.load(manifest_file)
+        except json.JSONDecodeError as error:
+            print(
+                f"Error: The manifest {manifest_path} is no valid JSON: {error}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    if not isinstance(raw_jobs, list):
         print(
-            "Error: The template path is not a subpath of the template environment path.",
+            f"Error: The manifest {manifest_path} must contain a list.",
             file=sys.stderr,
         )
         sys.exit(1)
-    template_name = str(template_path.relative_to(template_env_path))
+    jobs: List[RenderJob] = []
+    output_paths: Set[Path] = set()
+    for raw_job in raw_jobs:
+        if (
+            not isinstance(raw_job, dict)
+            or not isinstance(raw_job.get("template"), str)
+            or not isinstance(raw_job.get("output"), str)
+        ):
+            print(
+                f"Error: Every entry in the manifest {manifest_path} needs a template and an output path, not {raw_job}.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        job = RenderJob(
+            manifest_path.parent / raw_job["template"],
+            manifest_path.parent / raw_job["output"],
+        )
+        if job.output_path in output_paths:
+            print(
+                f"Error: The manifest {manifest_path} writes to {job.output_path} twice.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        output_paths.add(job.output_path)
+        jobs.append(job)
+    return jobs
 
-    netlist = connect_netlist(parse_group_netlist(netlist_path))
 
-    def glob_groups(glob_str: str) -> List[GroupWithConnection]:
-        pattern = compile_group_glob(glob_str)
-        groups = [
-            group
-            for group in netlist.groups.values()
-            if does_match_pattern(pattern, group.get_id())
-        ]
-        groups.sort(key=lambda g: g.get_id())
-        return groups
-
-    env = Environment(
-        loader=FileSystemLoader(
-            template_env_path,
-            followlinks=True,
-        ),
-        trim_blocks=True,
-        lstrip_blocks=True,
-        undefined=StrictUndefined,
+class _BatchState(NamedTuple):
+    jobs: List[RenderJob]
+    """
+    One environment per template directory environment.
+    """
+    environments: Dict[Path, Environment]
+    template_dir_env: Path | None
+    render_context: Dict[str, Any]
+
+
+"""
+Forked worker processes inherit this instead of having it pickled.
+"""
+_batch_state: _BatchState | None = None
+
+
+def _render_job(job_index: int) -> float:
+    """
+    Render a single job of the batch and return how long that took in seconds.
+    """
+    assert _batch_state is not None
+    start = time.perf_counter()
+    job = _batch_state.jobs[job_index]
+    template_env_path = (
+        _batch_state.template_dir_env
+        if _batch_state.template_dir_env is not None
+        else job.template_path.parent
     )
-    template = env.get_template(template_name)
-    output = template.render(
-        netlist=netlist,
-        glob_groups=glob_groups,
-        stringify_group_id=stringify_group_id,
-        pascal_case=_pascal_case,
-        camel_case=_camel_case,
-        get_parent_group_path=get_parent_group_path,
+    env = _batch_state.environments[template_env_path]
+    template = env.get_template(
+        _get_template_name(job.template_path, template_env_path)
     )
-    if output_path is not None:
-        print(f"Printing output to: {output_path}")
-        with open(output_path, "w") as file:
-            file.write(output)
+    output = template.render(_batch_state.render_context)
+    write_text_if_changed(job.output_path, output)
+    return time.perf_counter() - start
+
+
+def _render_batch(render_jobs: List[RenderJob], executor: Executor | None) -> bool:
+    """
+    Render all jobs of the batch state, on the executor if provided.
+    Return whether any job failed.
+    """
+    failed = False
+    if executor is None:
+        futures = None
     else:
-        print(output)
+        futures = [
+            executor.submit(_render_job, job_index)
+            for job_index in range(len(render_jobs))
+        ]
+    for job_index, job in enumerate(render_jobs):
+        try:
+            seconds = (
+                _render_job(job_index)
+                if futures is None
+                else futures[job_index].result()
+            )
+        except Exception as error:
+            print(
+                f"Error: Rendering {job.template_path} to {job.output_path} failed: {error!r}",
+                file=sys.stderr,
+            )
+            failed = True
+            continue
+        print(f"Rendered {job.output_path} in {seconds:.3f} s")
+    return failed
+
+
+def generate_code_batch(
+    netlist_path: Path,
+    manifest_path: Path,
+    template_dir_env: Path | None,
+    jobs: int,
+    pool_kind: PoolKind,
+    verify: VerifyPolicy = VerifyPolicy.hash,
+    parse_cache: bool = False,
+    parse_cache_dir: Path | None = None,
+    bytecode_cache_dir: Path | None = None,
+    precompiled_templates_path: Path | None = None,
+) -> None:
+    """
+    Render every template in the manifest against a single parsed and connected Group Netlist.
+    With more than one job, the templates are rendered in parallel on a pool of `pool_kind`.
+    """
+    global _batch_state
+    render_jobs = read_manifest(manifest_path)
+
+    start = time.perf_counter()
+    with span("parse"):
+        group_netlist = parse_group_netlist(
+            netlist_path, verify, parse_cache, parse_cache_dir
+        )
+    count_netlist(group_netlist.groups, group_netlist.nets)
+    with span("connect"):
+        netlist = connect_netlist(group_netlist)
+    print(f"Parsed {netlist_path} in {time.perf_counter() - start:.3f} s")
+
+    environments: Dict[Path, Environment] = dict()
+    for job in render_jobs:
+        template_env_path = (
+            template_dir_env
+            if template_dir_env is not None
+            else job.template_path.parent
+        )
+        # Exit early when a template is outside its environment.
+        _get_template_name(job.template_path, template_env_path)
+        if template_env_path not in environments:
+            environments[template_env_path] = create_environment(
+                template_env_path, bytecode_cache_dir, precompiled_templates_path
+            )
+    _batch_state = _BatchState(
+        render_jobs, environments, template_dir_env, _create_render_context(netlist)
+    )
+
+    executor: Executor | None = None
+    if jobs > 1:
+        match pool_kind:
+            case PoolKind.thread:
+                executor = ThreadPoolExecutor(max_workers=jobs)
+            case PoolKind.process:
+                if "fork" not in multiprocessing.get_all_start_methods():
+                    print(
+                        "Warning: This platform can't fork, rendering with threads instead.",
+                        file=sys.stderr,
+                    )
+                    executor = ThreadPoolExecutor(max_workers=jobs)
+                else:
+                    executor = ProcessPoolExecutor(
+                        max_workers=jobs,
+                        mp_context=multiprocessing.get_context("fork"),
+                    )
+
+    try:
+        # Templates rendered in other processes don't add to the counts.
+        with span("render"):
+            failed = _render_batch(render_jobs, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _batch_state = None
+    if failed:
+        sys.exit(1)
 
 
 def main() -> None:
@@ -116,7 +471,9 @@ def main() -> None:
         "This file may include other template files. "
         "You may specify the template directory environment these included template files are relative to. "
         "See the --template-dir-env argument. "
-        "Alternatively, code_gen uses the parent directory of the template_file_path.",
+        "Alternatively, code_gen uses the parent directory of the template_file_path. "
+        "Leave this out when using --manifest.",
+        nargs="?",
     )
     parser.add_argument(
         "--template-dir-env",
@@ -126,13 +483,131 @@ def main() -> None:
         "--output",
         help="The output path. Print to stdout if not provided.",
     )
+    parser.add_argument(
+        "--manifest",
+        help="Render many templates in one go instead of a single one. "
+        "The manifest is a JSON list of objects with a 'template' and an 'output' path, "
+        'e.g., [{"template": "pindefs.jinja2", "output": "pindefs.h"}]. '
+        "Relative paths are relative to the manifest. "
+        "The Group Netlist is parsed only once for all of them.",
+    )
+    parser.add_argument(
+        "--jobs",
+        help="How many templates of the manifest to render in parallel.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--pool",
+        help="Render in parallel with threads or processes. "
+        "Processes render faster but need the fork start method.",
+        type=PoolKind,
+        choices=list(PoolKind),
+        default=PoolKind.process,
+    )
+    parser.add_argument(
+        "--verify",
+        help=VERIFY_POLICY_HELP,
+        type=VerifyPolicy,
+        choices=list(VerifyPolicy),
+        default=VerifyPolicy.hash,
+    )
+    parser.add_argument(
+        "--parse-cache",
+        help=PARSE_CACHE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--parse-cache-dir",
+        help=PARSE_CACHE_DIR_HELP,
+    )
+    parser.add_argument(
+        "--bytecode-cache-dir",
+        help="Store the compiled templates in this directory and reuse them in later runs as long as the templates haven't changed.",
+    )
+    parser.add_argument(
+        "--precompiled-templates",
+        help="Load the templates from this archive created by code_gen_precompile instead of compiling them. "
+        "The template names must be relative to the same template directory environment the archive was created from. "
+        "Templates missing from the archive are compiled from their source. "
+        "Recreate the archive whenever a template changes.",
+    )
+    parser.add_argument(
+        "--depfile",
+        help="Also write a Make dependency file, which Ninja reads as well, to this path. "
+        "It lists the Group Netlist and every template file loaded while rendering, including included ones, as dependencies of the output. "
+        "Requires --output and can't be combined with --manifest. "
+        "An unchanged output isn't rewritten and keeps its old modification time, "
+        "so let the build system check the output again after running code_gen, e.g., with restat = 1 in Ninja. "
+        "Otherwise, it runs code_gen on every build once an input changed without changing the output.",
+    )
+    parser.add_argument(
+        "--profile",
+        help=PROFILE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats-json",
+        help=STATS_JSON_HELP,
+    )
+    parser.add_argument(
+        "--profile-memory",
+        help=PROFILE_MEMORY_HELP,
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.profile or args.stats_json is not None or args.profile_memory:
+        enable_instrumentation(args.profile_memory)
 
-    generate_code(
-        Path(args.group_netlist_file),
-        Path(args.template_file_path),
-        None if args.template_dir_env is None else Path(args.template_dir_env),
-        None if args.output is None else Path(args.output),
+    bytecode_cache_dir = (
+        None if args.bytecode_cache_dir is None else Path(args.bytecode_cache_dir)
+    )
+    precompiled_templates_path = (
+        None if args.precompiled_templates is None else Path(args.precompiled_templates)
+    )
+    if args.manifest is not None:
+        if (
+            args.template_file_path is not None
+            or args.output is not None
+            or args.depfile is not None
+        ):
+            parser.error(
+                "--manifest can't be combined with template_file_path, --output or --depfile."
+            )
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1.")
+        generate_code_batch(
+            Path(args.group_netlist_file),
+            Path(args.manifest),
+            None if args.template_dir_env is None else Path(args.template_dir_env),
+            args.jobs,
+            args.pool,
+            args.verify,
+            args.parse_cache or args.parse_cache_dir is not None,
+            None if args.parse_cache_dir is None else Path(args.parse_cache_dir),
+            bytecode_cache_dir,
+            precompiled_templates_path,
+        )
+    else:
+        if args.template_file_path is None:
+            parser.error("Either template_file_path or --manifest is required.")
+        if args.depfile is not None and args.output is None:
+            parser.error("--depfile requires --output.")
+        generate_code(
+            Path(args.group_netlist_file),
+            Path(args.template_file_path),
+            None if args.template_dir_env is None else Path(args.template_dir_env),
+            None if args.output is None else Path(args.output),
+            args.verify,
+            args.parse_cache or args.parse_cache_dir is not None,
+            None if args.parse_cache_dir is None else Path(args.parse_cache_dir),
+            bytecode_cache_dir,
+            precompiled_templates_path,
+            None if args.depfile is None else Path(args.depfile),
+        )
+    report_instrumentation(
+        args.profile or args.profile_memory,
+        None if args.stats_json is None else Path(args.stats_json),
     )
 
 
@@ -0,0 +1,101 @@
+import argparse
+import py_compile
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import List
+
+from jinja2 import ModuleLoader, TemplateSyntaxError
+
+from code_gen.code_gen import create_environment
+
+TOOL_NAME = "code_gen_precompile v0.1.0"
+TOOL_NAME_WITH_VERSION = f"{TOOL_NAME} v0.1.0"
+
+
+def precompile_templates(
+    template_dir_env: Path, extensions: List[str], output_path: Path
+) -> None:
+    """
+    This function does the same and has the same parameters as the code_gen_precompile CLI interface.
+    """
+    if not template_dir_env.is_dir():
+        print(
+            f"Error: The template directory environment {template_dir_env} is no directory.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    # The templates have to be compiled with the very same settings code_gen renders them with.
+    env = create_environment(template_dir_env)
+    template_names = env.list_templates(extensions=extensions)
+    with (
+        tempfile.TemporaryDirectory() as tmp_dir,
+        zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as archive,
+    ):
+        for template_name in template_names:
+            source, filename, _ = env.loader.get_source(env, template_name)
+            try:
+                # ModuleLoader needs the deferred initialization.
+                module_source = env.compile(
+                    source, template_name, filename, raw=True, defer_init=True
+                )
+            except TemplateSyntaxError as error:
+                print(
+                    f"Error: The template {template_name} is invalid in line {error.lineno}: {error.message}",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+
+            # Jinja2's ModuleLoader imports the template's module by this name.
+            module_filename = ModuleLoader.get_module_filename(template_name)
+            module_path = Path(tmp_dir) / module_filename
+            with open(module_path, "w") as module_file:
+                module_file.write(module_source)
+            # Also store the Python bytecode so that importing doesn't compile the module's source.
+            # Python only uses bytecode of its own version and falls back to the source otherwise.
+            py_compile.compile(
+                str(module_path),
+                cfile=str(module_path) + "c",
+                dfile=module_filename,
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+            archive.write(module_path, module_filename)
+            archive.write(str(module_path) + "c", module_filename + "c")
+    print(f"Precompiled {len(template_names)} templates into: {output_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog=TOOL_NAME,
+        description="Compile all Jinja2 templates in a template directory environment into an archive. "
+        "code_gen loads templates from that archive without compiling them when given the --precompiled-templates argument. "
+        "Errors are printed to stderr.",
+    )
+    parser.add_argument(
+        "template_dir_env",
+        help="The path to the Jinja2 template directory environment.",
+    )
+    parser.add_argument(
+        "--extension",
+        help="Only compile templates with this file extension. "
+        "You may provide multiple. "
+        "Defaults to jinja2.",
+        action="append",
+    )
+    parser.add_argument(
+        "--output",
+        help="The path of the archive.",
+        required=True,
+    )
+    args = parser.parse_args()
+    precompile_templates(
+        Path(args.template_dir_env),
+        ["jinja2"] if args.extension is None else args.extension,
+        Path(args.output),
+    )
+
+
+if __name__ == "__main__":
+    main()
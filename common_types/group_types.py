@@ -1,9 +1,24 @@
+import collections.abc
+import functools
 import glob
 import re
 from datetime import datetime
 from pathlib import Path
 import sys
-from typing import Dict, FrozenSet, List, NamedTuple, NewType, Set
+from typing import (
+    AbstractSet,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    NewType,
+    Set,
+    Tuple,
+)
+
+from common_types.instrumentation import increment_count
 
 Schematic = NewType("Schematic", str)
 """
@@ -33,10 +48,213 @@ These pins are connected.
 MutableGroupNet = NewType("MutableGroupNet", Set[GlobalGroupPinIdentifier])
 GroupNet = NewType("GroupNet", FrozenSet[GlobalGroupPinIdentifier])
 
-GroupGlob = NewType("GroupGlob", FrozenSet[re.Pattern[str]])
+
+class OtherPins(collections.abc.Set[GlobalGroupPinIdentifier]):
+    """
+    The pins of a net except for one pin, i.e., what that pin is connected to.
+    All pins of a net share the net instead of each having its own copy.
+    This keeps the memory linear in the number of pins even for huge nets like GND.
+    It is read-only: It has the non-mutating methods of set but not add, discard and the like.
+    """
+
+    __slots__ = ("net", "excluded_pin", "_len")
+
+    net: GroupNet
+    excluded_pin: GlobalGroupPinIdentifier
+    _len: int
+
+    def __init__(self, net: GroupNet, excluded_pin: GlobalGroupPinIdentifier) -> None:
+        self.net = net
+        self.excluded_pin = excluded_pin
+        self._len = len(net) - (1 if excluded_pin in net else 0)
+
+    @classmethod
+    def _from_iterable(
+        cls, iterable: Iterable[GlobalGroupPinIdentifier]
+    ) -> Set[GlobalGroupPinIdentifier]:
+        # Set operations like | and & return ordinary sets.
+        return set(iterable)
+
+    def __contains__(self, pin: object) -> bool:
+        return pin != self.excluded_pin and pin in self.net
+
+    def __iter__(self) -> Iterator[GlobalGroupPinIdentifier]:
+        for pin in self.net:
+            if pin != self.excluded_pin:
+                yield pin
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __repr__(self) -> str:
+        return f"OtherPins({set(self)!r})"
+
+    # The pins used to be ordinary sets, so templates may still use their non-mutating methods.
+    # These return ordinary sets; mutating an OtherPins itself isn't possible because the net is shared.
+    def copy(self) -> Set[GlobalGroupPinIdentifier]:
+        return set(self)
+
+    def union(
+        self, *others: Iterable[GlobalGroupPinIdentifier]
+    ) -> Set[GlobalGroupPinIdentifier]:
+        return set(self).union(*others)
+
+    def intersection(
+        self, *others: Iterable[GlobalGroupPinIdentifier]
+    ) -> Set[GlobalGroupPinIdentifier]:
+        return set(self).intersection(*others)
+
+    def difference(
+        self, *others: Iterable[GlobalGroupPinIdentifier]
+    ) -> Set[GlobalGroupPinIdentifier]:
+        return set(self).difference(*others)
+
+    def symmetric_difference(
+        self, other: Iterable[GlobalGroupPinIdentifier]
+    ) -> Set[GlobalGroupPinIdentifier]:
+        return set(self).symmetric_difference(other)
+
+    def issubset(self, other: Iterable[GlobalGroupPinIdentifier]) -> bool:
+        return set(self).issubset(other)
+
+    def issuperset(self, other: Iterable[GlobalGroupPinIdentifier]) -> bool:
+        return set(self).issuperset(other)
+
+
+class GroupGlob:
+    """
+    A group glob is a list of path globs with *, **, [].
+    Each path glob is separated with a , (a single comma without spaces).
+    A group glob matches a group when any of its path globs matches the stringified group id.
+    """
+
+    glob_str: str
+    """
+    The path globs the group glob consists of.
+    """
+    path_glob_strs: List[str]
+    """
+    All path globs combined into a single alternation.
+    """
+    _pattern: re.Pattern[str]
+    """
+    Remember what group ids this glob matches.
+    """
+    _matches: Dict[GroupIdentifier, bool]
+
+    def __init__(self, group_glob_str: str) -> None:
+        self.glob_str = group_glob_str
+        self.path_glob_strs = group_glob_str.split(",")
+        regexes = [
+            glob.translate(single_group_glob_str, recursive=True, include_hidden=True)
+            for single_group_glob_str in self.path_glob_strs
+        ]
+        self._pattern = re.compile("|".join(regexes))
+        self._matches = dict()
+
+    def matches(self, group_id: GroupIdentifier) -> bool:
+        # This runs for every pin in hot loops, so only the rare evaluations are counted here.
+        if group_id not in self._matches:
+            increment_count("glob evaluations")
+            self._matches[group_id] = (
+                self._pattern.match(stringify_group_id(group_id)) is not None
+            )
+        return self._matches[group_id]
+
+    def filter(self, group_ids: Iterable[GroupIdentifier]) -> List[GroupIdentifier]:
+        """
+        Return all group ids that match in the order they were given.
+        """
+        group_ids = list(group_ids)
+        increment_count("glob filter candidates", len(group_ids))
+        return [group_id for group_id in group_ids if self.matches(group_id)]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, GroupGlob) and self.glob_str == other.glob_str
+
+    def __hash__(self) -> int:
+        return hash(self.glob_str)
+
+    def __str__(self) -> str:
+        return self.glob_str
+
+    def __repr__(self) -> str:
+        return f"GroupGlob({self.glob_str!r})"
+
+
+class _GroupPathTrieNode:
+    children: Dict[str, "_GroupPathTrieNode"]
+    """
+    All group ids in this subtree in sorted order.
+    """
+    group_ids: List[GroupIdentifier]
+
+    def __init__(self) -> None:
+        self.children = dict()
+        self.group_ids = []
+
+
+class GroupPathIndex:
+    """
+    Index group ids in a trie of the nodes of their stringified ids, i.e., schematic, path nodes and group type.
+    A path glob that starts with literal nodes, like `mainboard/Power/**`, only has to look at the matching subtree.
+    """
+
+    _root: _GroupPathTrieNode
+    """
+    Remember the result of every group glob.
+    """
+    _results: Dict[GroupGlob, List[GroupIdentifier]]
+
+    def __init__(self, group_ids: Iterable[GroupIdentifier]) -> None:
+        self._root = _GroupPathTrieNode()
+        self._results = dict()
+        # Insert in sorted order so that every node's group ids are sorted, too.
+        for group_id in sorted(group_ids):
+            node = self._root
+            node.group_ids.append(group_id)
+            for path_node in stringify_group_id(group_id).split("/"):
+                if path_node not in node.children:
+                    node.children[path_node] = _GroupPathTrieNode()
+                node = node.children[path_node]
+                node.group_ids.append(group_id)
+
+    def _get_candidates(self, path_glob_str: str) -> List[GroupIdentifier]:
+        """
+        Return all group ids in the subtree of the literal nodes the path glob starts with.
+        """
+        node = self._root
+        for glob_node in path_glob_str.split("/"):
+            if any(c in glob_node for c in "*?["):
+                # Everything from here on might match anything.
+                break
+            if glob_node not in node.children:
+                return []
+            node = node.children[glob_node]
+        return node.group_ids
+
+    def glob(self, group_glob: GroupGlob) -> List[GroupIdentifier]:
+        """
+        Return all group ids that match `group_glob` in sorted order.
+        """
+        if group_glob not in self._results:
+            if len(group_glob.path_glob_strs) == 1:
+                candidates = self._get_candidates(group_glob.path_glob_strs[0])
+            else:
+                # The path globs' subtrees may overlap.
+                candidates = sorted({
+                    group_id
+                    for path_glob_str in group_glob.path_glob_strs
+                    for group_id in self._get_candidates(path_glob_str)
+                })
+            self._results[group_glob] = group_glob.filter(candidates)
+        # Don't let the caller change the cached result.
+        return list(self._results[group_glob])
 
 
 class Group:
+    __slots__ = ("schematic", "path", "group_type", "group_map_fields", "pins")
+
     # This is not a single group_id to allow building this object step by step.
     schematic: Schematic
     path: GroupPath
@@ -54,7 +272,68 @@ class Group:
         return GroupIdentifier(self.schematic, self.path, self.group_type)
 
 
+class PinNetIndex:
+    """
+    Look up the net a pin belongs to.
+    The index is only built when the first pin is looked up.
+    """
+
+    _nets: Iterable[GroupNet]
+    """
+    Map every pin that is part of a net to that net.
+    None until the first lookup.
+    """
+    _pin_nets: Dict[GlobalGroupPinIdentifier, GroupNet] | None
+    """
+    Remember what pins of a net match a group glob.
+    """
+    _matching_pins: Dict[Tuple[GroupGlob, GroupNet], GroupNet]
+
+    def __init__(self, nets: Iterable[GroupNet]) -> None:
+        self._nets = nets
+        self._pin_nets = None
+        self._matching_pins = dict()
+
+    def get_net(self, pin: GlobalGroupPinIdentifier) -> GroupNet | None:
+        """
+        Return None when the pin isn't connected to anything.
+        """
+        if self._pin_nets is None:
+            # Only publish the finished index because templates may be rendered in multiple threads.
+            pin_nets: Dict[GlobalGroupPinIdentifier, GroupNet] = dict()
+            for net in self._nets:
+                for global_pin in net:
+                    # A pin can only be part of one net.
+                    assert global_pin not in pin_nets
+                    pin_nets[global_pin] = net
+            self._pin_nets = pin_nets
+        return self._pin_nets.get(pin)
+
+    def get_matching_pins(self, net: GroupNet, group_glob: GroupGlob) -> GroupNet:
+        """
+        Return the pins of `net` on groups that match `group_glob`.
+        Each net is filtered only once per group glob, no matter how many pins it has.
+        """
+        key = (group_glob, net)
+        if key not in self._matching_pins:
+            self._matching_pins[key] = GroupNet(
+                frozenset(pin for pin in net if group_glob.matches(pin.group_id))
+            )
+        return self._matching_pins[key]
+
+
 class GroupWithConnection:
+    __slots__ = (
+        "schematic",
+        "path",
+        "group_type",
+        "group_map_fields",
+        "_pin_names",
+        "_pin_net_index",
+        "_pins",
+        "_pins_to_glob_cache",
+    )
+
     # This is not a single group_id to allow building this object step by step.
     schematic: Schematic
     path: GroupPath
@@ -64,36 +343,94 @@ class GroupWithConnection:
     """
     group_map_fields: Dict[str, str]
     """
-    All the pins this group has and what they are connected to.
+    The names of all the pins this group has.
+    """
+    _pin_names: Iterable[GroupPinName]
+    """
+    Where to look up what the pins are connected to.
+    """
+    _pin_net_index: PinNetIndex
+    """
+    None until pins is first accessed.
     """
-    pins: Dict[GroupPinName, Set[GlobalGroupPinIdentifier]]
+    _pins: Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]] | None
+    """
+    Map a glob string to the result of _get_pins_to_glob.
+    """
+    _pins_to_glob_cache: Dict[
+        str, Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]]
+    ]
+
+    def __init__(
+        self, pin_names: Iterable[GroupPinName], pin_net_index: PinNetIndex
+    ) -> None:
+        self._pin_names = pin_names
+        self._pin_net_index = pin_net_index
+        self._pins = None
+        self._pins_to_glob_cache = dict()
+
+    @property
+    def pins(self) -> Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]]:
+        """
+        All the pins this group has and what they are connected to.
+        This is only computed when first accessed.
+        """
+        if self._pins is None:
+            group_id = self.get_id()
+            pins: Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]] = dict()
+            for pin_name in self._pin_names:
+                own_pin = GlobalGroupPinIdentifier(group_id, pin_name)
+                net = self._pin_net_index.get_net(own_pin)
+                pins[pin_name] = OtherPins(
+                    GroupNet(frozenset()) if net is None else net, own_pin
+                )
+            self._pins = pins
+        return self._pins
+
+    @pins.setter
+    def pins(
+        self, pins: Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]]
+    ) -> None:
+        self._pins = pins
+        # The pins to glob connections are computed from the pins.
+        self._pins_to_glob_cache.clear()
 
     def get_id(self) -> GroupIdentifier:
         return GroupIdentifier(self.schematic, self.path, self.group_type)
 
     def _get_pins_to_glob(
         self, glob_str: str
-    ) -> Dict[GroupPinName, Set[GlobalGroupPinIdentifier]]:
+    ) -> Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]]:
         """
         Return all pins of this group.
         For each returned pin, return a set of the pins on other groups that match `glob_str`.
         This means that all other groups that don't match are ignored.
+        The result is computed once per glob string and then cached.
         """
+        if glob_str in self._pins_to_glob_cache:
+            return self._pins_to_glob_cache[glob_str]
+
         pattern = compile_group_glob(glob_str)
-        pins: Dict[GroupPinName, Set[GlobalGroupPinIdentifier]] = dict()
+        pins: Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]] = dict()
         for pin, other_pins in self.pins.items():
-            # This should be Set[GlobalGroupPinIdentifier] but that isn't known at runtime.
-            assert type(other_pins) is set
-            pins[pin] = {
-                GlobalGroupPinIdentifier(other_group, other_pin)
-                for (other_group, other_pin) in other_pins
-                if does_match_pattern(pattern, other_group)
-            }
+            if isinstance(other_pins, OtherPins):
+                # All pins of a net share the filtered net.
+                pins[pin] = OtherPins(
+                    self._pin_net_index.get_matching_pins(other_pins.net, pattern),
+                    other_pins.excluded_pin,
+                )
+            else:
+                pins[pin] = {
+                    GlobalGroupPinIdentifier(other_group, other_pin)
+                    for (other_group, other_pin) in other_pins
+                    if pattern.matches(other_group)
+                }
+        self._pins_to_glob_cache[glob_str] = pins
         return pins
 
     # def get_pins_to_glob_reduced(
     #     self, glob_str: str
-    # ) -> Dict[GroupPinName, Set[GlobalGroupPinIdentifier]]:
+    # ) -> Dict[GroupPinName, AbstractSet[GlobalGroupPinIdentifier]]:
     #     """
     #     Same as get_pins_to_glob but with all pins that aren't connected to anything removed.
     #     """
@@ -146,6 +483,88 @@ class GroupNetlist:
     nets: Set[GroupNet]
 
 
+class CompactGroupNetlist(NamedTuple):
+    """
+    A GroupNetlist in builtin types only.
+    It pickles much smaller and faster than the GroupNetlist, e.g., to send it to another process.
+    """
+
+    sources: Set[Path]
+    date: datetime
+    tool: str
+    """
+    The schematic, path, type, group map fields and pins of each group.
+    """
+    groups: List[
+        Tuple[Schematic, GroupPath, GroupType, Dict[str, str], Tuple[GroupPinName, ...]]
+    ]
+    """
+    The indices of the nodes' groups in `groups` and the nodes' pins of each net.
+    """
+    nets: List[Tuple[Tuple[int, ...], Tuple[GroupPinName, ...]]]
+
+
+def compact_group_netlist(netlist: GroupNetlist) -> CompactGroupNetlist:
+    group_indices = {group_id: index for index, group_id in enumerate(netlist.groups)}
+    return CompactGroupNetlist(
+        netlist.sources,
+        netlist.date,
+        netlist.tool,
+        [
+            (
+                group.schematic,
+                group.path,
+                group.group_type,
+                group.group_map_fields,
+                tuple(group.pins),
+            )
+            for group in netlist.groups.values()
+        ],
+        [
+            (
+                tuple(group_indices[node.group_id] for node in net),
+                tuple(node.pin for node in net),
+            )
+            for net in netlist.nets
+        ],
+    )
+
+
+def expand_group_netlist(compact_netlist: CompactGroupNetlist) -> GroupNetlist:
+    """
+    Turn the compact representation back into a GroupNetlist.
+    Just like when parsing, all names are interned and the nodes share the group ids of the groups.
+    """
+    netlist = GroupNetlist()
+    netlist.sources = compact_netlist.sources
+    netlist.date = compact_netlist.date
+    netlist.tool = compact_netlist.tool
+    netlist.groups = dict()
+    group_ids: List[GroupIdentifier] = []
+    for schematic, path, group_type, group_map_fields, pins in compact_netlist.groups:
+        group = Group()
+        group.schematic = Schematic(sys.intern(schematic))
+        group.path = GroupPath(sys.intern(path))
+        group.group_type = GroupType(sys.intern(group_type))
+        group.group_map_fields = group_map_fields
+        group.pins = {GroupPinName(sys.intern(pin)) for pin in pins}
+        group_id = group.get_id()
+        group_ids.append(group_id)
+        netlist.groups[group_id] = group
+    netlist.nets = {
+        GroupNet(
+            frozenset(
+                GlobalGroupPinIdentifier(
+                    group_ids[group_index], GroupPinName(sys.intern(pin))
+                )
+                for group_index, pin in zip(group_indices, pins)
+            )
+        )
+        for group_indices, pins in compact_netlist.nets
+    }
+    return netlist
+
+
 class GroupNetlistWithConnections:
     """
     Represent what groups there are and how they are connected.
@@ -163,6 +582,7 @@ class GroupNetlistWithConnections:
     groups: Dict[GroupIdentifier, GroupWithConnection]
 
 
+@functools.cache
 def stringify_group_id(id: GroupIdentifier) -> str:
     """
     The stringified group id resembles a path uniquely identifying this group.
@@ -187,69 +607,50 @@ def get_parent_group_path(path: GroupPath) -> GroupPath:
     return GroupPath("/".join(nodes))
 
 
+@functools.cache
 def compile_group_glob(group_glob_str: str) -> GroupGlob:
     """
-    A group glob is a list of path globs with *, **, [].
-    Each path glob is separated with a , (a single comma without spaces).
+    Compile every distinct group glob only once.
     """
-    globs = group_glob_str.split(",")
-    regexes = {
-        re.compile(
-            glob.translate(single_group_glob_str, recursive=True, include_hidden=True)
-        )
-        for single_group_glob_str in globs
-    }
-    return GroupGlob(frozenset(regexes))
+    return GroupGlob(group_glob_str)
 
 
-# TODO: maybe make a class out of this.
 def does_match_pattern(
     pattern: GroupGlob | None, group_id: GroupIdentifier, when_none: bool = False
 ) -> bool:
+    """
+    Kept for compatibility, prefer `GroupGlob.matches` and `GroupGlob.filter`.
+    """
     if pattern is None:
         return when_none
-    for single_pattern in pattern:
-        if single_pattern.match(stringify_group_id(group_id)) is not None:
-            return True
-    return False
+    return pattern.matches(group_id)
 
 
-def _dumb_connect_group(group: Group) -> GroupWithConnection:
-    connected_group = GroupWithConnection()
+def _lazily_connect_group(
+    group: Group, pin_net_index: PinNetIndex
+) -> GroupWithConnection:
+    connected_group = GroupWithConnection(group.pins, pin_net_index)
     connected_group.schematic = group.schematic
     connected_group.path = group.path
     connected_group.group_type = group.group_type
     connected_group.group_map_fields = group.group_map_fields
-    # Simply pretend the group isn't connected to anything.
-    connected_group.pins = {pin: set() for pin in group.pins}
     return connected_group
 
 
 def connect_netlist(netlist: GroupNetlist) -> GroupNetlistWithConnections:
+    """
+    Figure out what groups are connected how.
+    The connections of a group's pins are only computed when they are first accessed.
+    """
     connected_netlist = GroupNetlistWithConnections()
     connected_netlist.sources = netlist.sources
     connected_netlist.date = datetime.now()
     connected_netlist.tool = netlist.tool
+    pin_net_index = PinNetIndex(netlist.nets)
     connected_netlist.groups = {
-        group_id: _dumb_connect_group(group)
+        group_id: _lazily_connect_group(group, pin_net_index)
         for (group_id, group) in netlist.groups.items()
     }
-
-    # Figure out what groups are connected how.
-    for net in netlist.nets:
-        for group_identifier, group_pin_name in net:
-            # No one has touched this before so it must have remained empty.
-            assert (
-                len(connected_netlist.groups[group_identifier].pins[group_pin_name])
-                == 0
-            )
-            connected_netlist.groups[group_identifier].pins[group_pin_name] = {
-                other_pin
-                for other_pin in net
-                # Skip the own pin.
-                if other_pin
-                != GlobalGroupPinIdentifier(group_identifier, group_pin_name)
-            }
     return connected_netlist
 
 
@@ -262,10 +663,18 @@ CHAR_PATTERN = re.compile(r"^[a-zA-Z0-9_\-\+ ]$")
 CHAR_WITH_SLASH_PATTERN = re.compile(r"^[a-zA-Z0-9_/\-\+ ]$")
 
 
+@functools.cache
+def _is_valid_name(pattern: re.Pattern[str], in_str: str) -> bool:
+    """
+    The assert_is_ functions are called for the same few names over and over, so the result of the check is remembered.
+    """
+    return pattern.match(in_str) is not None
+
+
 def assert_is_group_path(in_str: str, lenient: bool = False) -> GroupPath:
     if lenient:
         in_str = replace_illegal_characters_wo_slash(in_str)
-    if GROUP_PATH_PATTERN.match(in_str) is None:
+    if not _is_valid_name(GROUP_PATH_PATTERN, in_str):
         print(
             f"Error: {in_str} is no valid GroupPath, consider the --lenient-names flag.",
             file=sys.stderr,
@@ -277,7 +686,7 @@ def assert_is_group_path(in_str: str, lenient: bool = False) -> GroupPath:
 def assert_is_schematic(in_str: str, lenient: bool = False) -> Schematic:
     if lenient:
         in_str = replace_illegal_characters(in_str)
-    if SCHEMATIC_PATTERN.match(in_str) is None:
+    if not _is_valid_name(SCHEMATIC_PATTERN, in_str):
         print(
             f"Error: {in_str} is no valid Schematic, consider the --lenient-names flag.",
             file=sys.stderr,
@@ -289,7 +698,7 @@ def assert_is_schematic(in_str: str, lenient: bool = False) -> Schematic:
 def assert_is_group_type(in_str: str, lenient: bool = False) -> GroupType:
     if lenient:
         in_str = replace_illegal_characters(in_str)
-    if GROUP_TYPE_PATTERN.match(in_str) is None:
+    if not _is_valid_name(GROUP_TYPE_PATTERN, in_str):
         print(
             f"Error: {in_str} is no valid GroupPath, consider the --lenient-names flag.",
             file=sys.stderr,
@@ -301,7 +710,7 @@ def assert_is_group_type(in_str: str, lenient: bool = False) -> GroupType:
 def assert_is_pin_name(in_str: str, lenient: bool = False) -> GroupPinName:
     if lenient:
         in_str = replace_illegal_characters(in_str)
-    if PIN_NAME_PATTERN.match(in_str) is None:
+    if not _is_valid_name(PIN_NAME_PATTERN, in_str):
         print(
             f"Error: {in_str} is no valid GroupPinName, consider the --lenient-names flag.",
             file=sys.stderr,
@@ -310,27 +719,76 @@ def assert_is_pin_name(in_str: str, lenient: bool = False) -> GroupPinName:
     return GroupPinName(in_str)
 
 
-def replace_illegal_characters(in_str: str) -> str:
-    def char_replace(c: str) -> str:
-        if CHAR_PATTERN.match(c) is None:
-            print(
-                f"Warning: replacing {c} in {in_str} with _",
-                file=sys.stderr,
-            )
-            return "_"
-        return c
+class _ReplaceIllegalCharactersTable(Dict[int, int]):
+    """
+    A str.translate table that maps every character that doesn't match `char_pattern` to _.
+    Every character is only checked the first time it is looked up.
+    """
 
-    return "".join(map(char_replace, in_str))
+    char_pattern: re.Pattern[str]
 
+    def __init__(self, char_pattern: re.Pattern[str]) -> None:
+        super().__init__()
+        self.char_pattern = char_pattern
 
-def replace_illegal_characters_wo_slash(in_str: str) -> str:
-    def char_replace(c: str) -> str:
-        if CHAR_WITH_SLASH_PATTERN.match(c) is None:
-            print(
-                f"Warning: replacing {c} in {in_str} with _",
-                file=sys.stderr,
-            )
-            return "_"
-        return c
+    def __missing__(self, code_point: int) -> int:
+        replacement = (
+            code_point
+            if self.char_pattern.match(chr(code_point)) is not None
+            else ord("_")
+        )
+        self[code_point] = replacement
+        return replacement
 
-    return "".join(map(char_replace, in_str))
+
+_REPLACE_ILLEGAL_CHARACTERS_TABLE = _ReplaceIllegalCharactersTable(CHAR_PATTERN)
+_REPLACE_ILLEGAL_CHARACTERS_WO_SLASH_TABLE = _ReplaceIllegalCharactersTable(
+    CHAR_WITH_SLASH_PATTERN
+)
+
+
+"""
+The names that have already been warned about in this run, with whether the slash was allowed.
+"""
+_warned_names: Set[Tuple[str, bool]] = set()
+
+
+def reset_name_warnings() -> None:
+    """
+    Call this at the start of every run so that each run warns about its own replaced names.
+    Several runs may share a process, e.g., the KiCad Netlists of a manifest.
+    """
+    _warned_names.clear()
+
+
+@functools.cache
+def _translate_illegal_characters(in_str: str, allow_slash: bool) -> str:
+    # Only the translation is remembered; the warning is printed once per run.
+    return in_str.translate(
+        _REPLACE_ILLEGAL_CHARACTERS_WO_SLASH_TABLE
+        if allow_slash
+        else _REPLACE_ILLEGAL_CHARACTERS_TABLE
+    )
+
+
+def _replace_illegal_characters(in_str: str, allow_slash: bool) -> str:
+    out_str = _translate_illegal_characters(in_str, allow_slash)
+    if out_str != in_str and (in_str, allow_slash) not in _warned_names:
+        _warned_names.add((in_str, allow_slash))
+        # Warn once per string instead of once per character.
+        replaced_chars = "".join(
+            dict.fromkeys(c for c, out_c in zip(in_str, out_str) if c != out_c)
+        )
+        print(
+            f"Warning: replacing {replaced_chars} in {in_str} with _",
+            file=sys.stderr,
+        )
+    return out_str
+
+
+def replace_illegal_characters(in_str: str) -> str:
+    return _replace_illegal_characters(in_str, False)
+
+
+def replace_illegal_characters_wo_slash(in_str: str) -> str:
+    return _replace_illegal_characters(in_str, True)
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Collection, Dict, Iterator, List, Sized, TextIO
+
+PROFILE_HELP = "Print how long each phase took and some counts to stderr."
+STATS_JSON_HELP = "Write how long each phase took and some counts as JSON to this file."
+PROFILE_MEMORY_HELP = (
+    "Also measure the peak memory Python allocates in each phase using tracemalloc. "
+    "This makes the run considerably slower."
+)
+
+
+class Phase:
+    name: str
+    """
+    Nested phases have the names of their parents as prefix, separated by `/`.
+    """
+    path: str
+    seconds: float
+    """
+    The highest memory peak seen so far while the phase is running.
+    None when memory isn't traced.
+    """
+    peak_memory_bytes: int | None
+
+
+class Instrumentation:
+    """
+    Collect the phases and counts of one run.
+    """
+
+    trace_memory: bool
+    """
+    Phases in the order they were started.
+    """
+    phases: List[Phase]
+    counts: Dict[str, int]
+    """
+    The phases that are running right now, innermost last.
+    """
+    open_phases: List[Phase]
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.counts = dict()
+        self.open_phases = []
+
+
+"""
+None when instrumentation is disabled, which makes all functions in this module no-ops.
+"""
+_instrumentation: Instrumentation | None = None
+
+
+def enable_instrumentation(trace_memory: bool) -> None:
+    global _instrumentation
+    _instrumentation = Instrumentation(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Measure the phase that runs in the with block.
+    Phases can be nested.
+    """
+    instrumentation = _instrumentation
+    if instrumentation is None:
+        yield
+        return
+
+    phase = Phase()
+    phase.name = name
+    phase.path = "/".join(
+        [open_phase.name for open_phase in instrumentation.open_phases] + [name]
+    )
+    phase.peak_memory_bytes = None
+    instrumentation.phases.append(phase)
+    if instrumentation.trace_memory:
+        # Resetting the peak would lose the peak of the enclosing phases, so remember it first.
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_phase in instrumentation.open_phases:
+            assert open_phase.peak_memory_bytes is not None
+            open_phase.peak_memory_bytes = max(open_phase.peak_memory_bytes, peak)
+        tracemalloc.reset_peak()
+        phase.peak_memory_bytes = 0
+    instrumentation.open_phases.append(phase)
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase.seconds = time.perf_counter() - start
+        instrumentation.open_phases.pop()
+        if phase.peak_memory_bytes is not None:
+            phase.peak_memory_bytes = max(
+                phase.peak_memory_bytes, tracemalloc.get_traced_memory()[1]
+            )
+
+
+def set_count(name: str, value: int) -> None:
+    if _instrumentation is not None:
+        _instrumentation.counts[name] = value
+
+
+def increment_count(name: str, amount: int = 1) -> None:
+    if _instrumentation is not None:
+        _instrumentation.counts[name] = _instrumentation.counts.get(name, 0) + amount
+
+
+def count_netlist(groups: Sized, nets: Collection[Sized]) -> None:
+    """
+    Record the size of a netlist.
+    """
+    set_count("groups", len(groups))
+    set_count("nets", len(nets))
+    set_count("largest net", max((len(net) for net in nets), default=0))
+
+
+def _write_report(instrumentation: Instrumentation, file: TextIO) -> None:
+    for phase in instrumentation.phases:
+        line = f"{phase.path:<40} {phase.seconds:9.3f} s"
+        if phase.peak_memory_bytes is not None:
+            line += f" {phase.peak_memory_bytes / 2**20:10.1f} MiB peak"
+        print(line, file=file)
+    for name, value in instrumentation.counts.items():
+        print(f"{name:<40} {value:9}", file=file)
+
+
+def _get_stats(instrumentation: Instrumentation) -> Dict[str, object]:
+    return {
+        "phases": [
+            {
+                "name": phase.path,
+                "seconds": phase.seconds,
+                "peak_memory_bytes": phase.peak_memory_bytes,
+            }
+            for phase in instrumentation.phases
+        ],
+        "counts": instrumentation.counts,
+    }
+
+
+def report_instrumentation(profile: bool, stats_json_path: Path | None) -> None:
+    """
+    Print the report to stderr when `profile` is set and write the stats to `stats_json_path` if provided.
+    """
+    if _instrumentation is None:
+        return
+    if profile:
+        _write_report(_instrumentation, sys.stderr)
+    if stats_json_path is not None:
+        with open(stats_json_path, "w") as stats_file:
+            json.dump(_get_stats(_instrumentation), stats_file, indent=4)
+            stats_file.write("\n")
@@ -0,0 +1,57 @@
+import contextlib
+import filecmp
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+# Outputs are only overwritten when their content changes.
+# Otherwise, build systems would rebuild everything depending on an output although nothing changed.
+
+
+def _has_same_bytes(new_path: Path, output_path: Path) -> bool:
+    return filecmp.cmp(new_path, output_path, shallow=False)
+
+
+@contextlib.contextmanager
+def open_output_if_changed(
+    output_path: Path,
+    is_unchanged: Callable[[Path, Path], bool] = _has_same_bytes,
+) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file next to `output_path` to write the output to.
+    After the with block, `output_path` is only overwritten when `is_unchanged` returns False
+    for the temporary file and the existing output.
+    By default, the content is compared byte by byte.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=output_path.parent, prefix=f".{output_path.name}.", delete=False
+    ) as tmp:
+        tmp_path = Path(tmp.name)
+    try:
+        with open(tmp_path, "wb") as tmp_file:
+            yield tmp_file
+        if output_path.is_file() and is_unchanged(tmp_path, output_path):
+            print(f"Keeping the unchanged output: {output_path}", file=sys.stderr)
+        else:
+            # Copying instead of renaming keeps the permissions of an existing output.
+            shutil.copyfile(tmp_path, output_path)
+    finally:
+        tmp_path.unlink()
+
+
+def write_text_if_changed(output_path: Path, text: str) -> None:
+    """
+    Write `text` to `output_path` unless the file already contains exactly that text.
+    """
+    try:
+        # Don't translate newlines so that only byte-identical outputs are kept.
+        with open(output_path, newline="") as old_file:
+            if old_file.read() == text:
+                print(f"Keeping the unchanged output: {output_path}", file=sys.stderr)
+                return
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    with open(output_path, "w") as file:
+        file.write(text)
@@ -1,9 +1,11 @@
+import hashlib
 import sys
 import tempfile
 import xml.etree.ElementTree as ET
 from datetime import datetime
+from enum import Enum
 from pathlib import Path
-from typing import Set, Tuple
+from typing import Dict, Set, Tuple
 
 from common_types.group_types import (
     GlobalGroupPinIdentifier,
@@ -11,28 +13,87 @@ from common_types.group_types import (
     Group,
     GroupIdentifier,
     GroupNet,
+    GroupPath,
+    GroupPinName,
+    GroupType,
+    Schematic,
     assert_is_group_path,
     assert_is_group_type,
     assert_is_pin_name,
     assert_is_schematic,
 )
-from common_types.stringify_xml import stringify_group_netlist
+from common_types.instrumentation import span
+from common_types.pickle_cache import load_pickle_cache, store_pickle_cache
+from common_types.stringify_xml import (
+    content_hash,
+    split_content_hash,
+    stringify_group_netlist,
+)
+
+
+class VerifyPolicy(Enum):
+    """
+    How parse_group_netlist checks that the file is what our tools wrote.
+    """
+
+    # Don't check anything.
+    off = "off"
+    # Stringify what we parsed and compare it with the file.
+    full = "full"
+    # Compare the content hash embedded in the file with the hash of the file.
+    # Files without a content hash fall back to full.
+    hash = "hash"
+
+    def __str__(self) -> str:
+        return self.value
+
 
+"""
+A passed check implies that all weaker checks would pass, too.
+"""
+VERIFY_STRENGTH = {VerifyPolicy.off: 0, VerifyPolicy.hash: 1, VerifyPolicy.full: 2}
 
-def _parse_group(group_tag: ET.Element) -> Group:
+"""
+Change this whenever the parsed representation changes to ignore old caches.
+"""
+PARSE_CACHE_VERSION = "kicad_firmware_generation v0.1.0, parse cache v1"
+PARSE_CACHE_SUFFIX = ".parse_cache"
+
+VERIFY_POLICY_HELP = (
+    "How to check that the Group Netlist hasn't been edited or created by a different version of the tools. "
+    "'off' skips the check. "
+    "'full' stringifies the parsed Group Netlist and compares it with the file. "
+    "'hash' only compares the content hash embedded in the file, falling back to 'full' for files without one. "
+    "Files with a matching content hash were written by our tools, so their names aren't validated again."
+)
+PARSE_CACHE_HELP = (
+    "Store the parsed Group Netlist in a binary cache file next to it and load that cache instead of parsing when the Group Netlist hasn't changed. "
+    "Only use caches you trust; they are Python pickles."
+)
+PARSE_CACHE_DIR_HELP = "Like --parse-cache but store the cache files in this directory."
+
+
+# All names are interned because the same schematics, paths, types and pins occur many times in large netlists.
+# Names are only validated when `validate_names` is set.
+def _parse_group(group_tag: ET.Element, validate_names: bool) -> Group:
     group = Group()
 
     schematic = group_tag.get("schematic")
     assert schematic is not None
-    group.schematic = assert_is_schematic(schematic)
+    group.schematic = Schematic(sys.intern(schematic))
 
     path = group_tag.get("path")
     assert path is not None
-    group.path = assert_is_group_path(path)
+    group.path = GroupPath(sys.intern(path))
 
     type_name = group_tag.get("type")
     assert type_name is not None
-    group.group_type = assert_is_group_type(type_name)
+    group.group_type = GroupType(sys.intern(type_name))
+
+    if validate_names:
+        assert_is_schematic(group.schematic)
+        assert_is_group_path(group.path)
+        assert_is_group_type(group.group_type)
 
     group.group_map_fields = dict()
     group_map_field_tags = group_tag.findall("./groupMapFields/groupMapField")
@@ -49,19 +110,20 @@ def _parse_group(group_tag: ET.Element) -> Group:
     for group_pin_tag in group_pin_tags:
         name = group_pin_tag.get("name")
         assert name is not None
-        pin_name = assert_is_pin_name(name)
+        pin_name = GroupPinName(sys.intern(name))
+        if validate_names:
+            assert_is_pin_name(pin_name)
         assert pin_name not in group.pins
         group.pins.add(pin_name)
 
     return group
 
 
-def _parse_xml_root(path: Path) -> Tuple[ET.Element, Set[Path], datetime, str]:
+def _parse_xml_root(document: bytes) -> Tuple[ET.Element, Set[Path], datetime, str]:
     """
     Return root element, source, date and tool.
     """
-    tree = ET.parse(path)
-    root = tree.getroot()
+    root = ET.fromstring(document)
 
     source_tags = root.findall("./netlist/sources/source")
     assert len(source_tags) > 0
@@ -84,61 +146,251 @@ def _parse_xml_root(path: Path) -> Tuple[ET.Element, Set[Path], datetime, str]:
     return root, sources, date, tool
 
 
-def _parse_group_node(node_tag: ET.Element) -> GlobalGroupPinIdentifier:
+def _parse_group_node(
+    node_tag: ET.Element,
+    group_ids: Dict[GroupIdentifier, GroupIdentifier],
+    validate_names: bool,
+) -> GlobalGroupPinIdentifier:
+    """
+    `group_ids` maps every group id to a single shared instance of itself.
+    """
     raw_schematic = node_tag.get("schematic")
     assert raw_schematic is not None
-    schematic = assert_is_schematic(raw_schematic)
-
     raw_path = node_tag.get("path")
     assert raw_path is not None
-    path = assert_is_group_path(raw_path)
-
     raw_type_name = node_tag.get("type")
     assert raw_type_name is not None
-    type_name = assert_is_group_type(raw_type_name)
+    group_id = GroupIdentifier(
+        Schematic(sys.intern(raw_schematic)),
+        GroupPath(sys.intern(raw_path)),
+        GroupType(sys.intern(raw_type_name)),
+    )
+    if group_id not in group_ids:
+        if validate_names:
+            # Known group ids have already been validated.
+            assert_is_schematic(group_id.schematic)
+            assert_is_group_path(group_id.path)
+            assert_is_group_type(group_id.group_type)
+        group_ids[group_id] = group_id
 
     raw_pin = node_tag.get("pin")
     assert raw_pin is not None
-    pin = assert_is_pin_name(raw_pin)
+    pin = GroupPinName(sys.intern(raw_pin))
+    if validate_names:
+        assert_is_pin_name(pin)
 
-    return GlobalGroupPinIdentifier(
-        GroupIdentifier(schematic, path, type_name),
-        pin,
-    )
+    return GlobalGroupPinIdentifier(group_ids[group_id], pin)
 
 
-def _parse_group_net(net_tag: ET.Element) -> GroupNet:
+def _parse_group_net(
+    net_tag: ET.Element,
+    group_ids: Dict[GroupIdentifier, GroupIdentifier],
+    validate_names: bool,
+) -> GroupNet:
     node_tags = net_tag.findall("./node")
-    return GroupNet(frozenset({_parse_group_node(node_tag) for node_tag in node_tags}))
+    return GroupNet(
+        frozenset({
+            _parse_group_node(node_tag, group_ids, validate_names)
+            for node_tag in node_tags
+        })
+    )
+
+
+def _verify_full(group_netlist: GroupNetlist, document: bytes) -> bool:
+    """
+    Check that stringifying what we parsed gets us back.
+    """
+    check_group_netlist = stringify_group_netlist(group_netlist)
+    if split_content_hash(document)[1] is None:
+        # The file predates content hashes.
+        check_group_netlist = split_content_hash(check_group_netlist)[0]
+    if check_group_netlist != document:
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(check_group_netlist)
+            print(
+                "Warning: The group netlist was created with a different stringify algorithm or is buggy. "
+                f"The parsed and then stringified file is in: {tmp.name}",
+                file=sys.stderr,
+            )
+        return False
+    return True
+
+
+def _has_matching_content_hash(document: bytes) -> bool:
+    """
+    Return False for files without a content hash.
+    """
+    document_wo_hash, embedded_hash = split_content_hash(document)
+    return embedded_hash is not None and content_hash(document_wo_hash) == embedded_hash
+
 
+def _verify_hash(group_netlist: GroupNetlist, document: bytes) -> bool:
+    """
+    Check that the content hash the file claims to have matches the file.
+    This is much cheaper than _verify_full but doesn't notice when the file has been created by a different stringify algorithm.
+    """
+    document_wo_hash, embedded_hash = split_content_hash(document)
+    if embedded_hash is None:
+        # The file predates content hashes.
+        return _verify_full(group_netlist, document)
+    if content_hash(document_wo_hash) != embedded_hash:
+        print(
+            "Warning: The content hash of the group netlist doesn't match. "
+            "The file has been edited after it was created or is corrupt.",
+            file=sys.stderr,
+        )
+        return False
+    return True
+
+
+def _verify(group_netlist: GroupNetlist, document: bytes, verify: VerifyPolicy) -> bool:
+    """
+    Return whether the check passed.
+    """
+    match verify:
+        case VerifyPolicy.off:
+            return True
+        case VerifyPolicy.full:
+            return _verify_full(group_netlist, document)
+        case VerifyPolicy.hash:
+            return _verify_hash(group_netlist, document)
 
-def parse_group_netlist(group_netlist_path: Path) -> GroupNetlist:
+
+def _parse_document(document: bytes, validate_names: bool) -> GroupNetlist:
     group_netlist = GroupNetlist()
     root, group_netlist.sources, group_netlist.date, group_netlist.tool = (
-        _parse_xml_root(group_netlist_path)
+        _parse_xml_root(document)
     )
 
     group_tags = root.findall("./groups/group")
     group_netlist.groups = dict()
     for group_tag in group_tags:
-        group = _parse_group(group_tag)
+        group = _parse_group(group_tag, validate_names)
         group_id = group.get_id()
         assert group_id not in group_netlist.groups
         group_netlist.groups[group_id] = group
 
     nets = root.findall("./nets/net")
-    group_netlist.nets = {_parse_group_net(net) for net in nets}
-
-    # Check that stringifying what we parsed gets us back.
-    with open(group_netlist_path, "rb") as group_netlist_file:
-        check_group_netlist = stringify_group_netlist(group_netlist)
-        if check_group_netlist != group_netlist_file.read():
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(check_group_netlist)
-                print(
-                    "Warning: The group netlist was created with a different stringify algorithm or is buggy. "
-                    f"The parsed and then stringified file is in: {tmp.name}",
-                    file=sys.stderr,
-                )
+    # Share the group ids of the groups with the nodes.
+    group_ids = {group_id: group_id for group_id in group_netlist.groups}
+    group_netlist.nets = {
+        _parse_group_net(net, group_ids, validate_names) for net in nets
+    }
+    return group_netlist
+
+
+def _parse_and_verify(
+    document: bytes, verify: VerifyPolicy
+) -> Tuple[GroupNetlist, bool]:
+    """
+    Return the parsed Group Netlist and whether the check passed.
+    """
+    if verify == VerifyPolicy.hash:
+        with span("verify"):
+            trusted = _has_matching_content_hash(document)
+        if trusted:
+            # The file is exactly what our tools wrote and they only write valid names.
+            with span("xml"):
+                return _parse_document(document, False), True
+
+    with span("xml"):
+        group_netlist = _parse_document(document, True)
+    with span("verify"):
+        passed = _verify(group_netlist, document, verify)
+    return group_netlist, passed
+
+
+def _get_parse_cache_path(
+    group_netlist_path: Path, cache_dir: Path | None, document_hash: str
+) -> Path:
+    if cache_dir is None:
+        # There is only one cache file next to the Group Netlist.
+        return group_netlist_path.with_name(
+            group_netlist_path.name + PARSE_CACHE_SUFFIX
+        )
+    # The cache directory may be shared by many Group Netlists.
+    return cache_dir / f"{document_hash}{PARSE_CACHE_SUFFIX}"
+
+
+def _load_parse_cache(
+    cache_path: Path, document_hash: str
+) -> Tuple[VerifyPolicy, GroupNetlist] | None:
+    """
+    Return the strongest check the cached Group Netlist passed and the Group Netlist.
+    Return None when there is no usable cache.
+    """
+
+    def read_header(header: Tuple[str, str, str]) -> VerifyPolicy | None:
+        version, cached_document_hash, verified_value = header
+        if version != PARSE_CACHE_VERSION or cached_document_hash != document_hash:
+            return None
+        return VerifyPolicy(verified_value)
+
+    cached = load_pickle_cache(cache_path, read_header)
+    if cached is None:
+        return None
+    verified, group_netlist = cached
+    if not isinstance(group_netlist, GroupNetlist):
+        return None
+    return verified, group_netlist
+
+
+def _store_parse_cache(
+    cache_path: Path,
+    document_hash: str,
+    verified: VerifyPolicy,
+    group_netlist: GroupNetlist,
+) -> None:
+    store_pickle_cache(
+        cache_path,
+        (PARSE_CACHE_VERSION, document_hash, verified.value),
+        group_netlist,
+        "parse cache",
+    )
+
+
+def parse_group_netlist(
+    group_netlist_path: Path,
+    verify: VerifyPolicy = VerifyPolicy.hash,
+    use_cache: bool = False,
+    cache_dir: Path | None = None,
+) -> GroupNetlist:
+    """
+    When `use_cache` is set, the parsed Group Netlist is stored in a binary cache file.
+    The cache is next to the Group Netlist or, if provided, in `cache_dir`.
+    Later calls load the cache instead of parsing the XML as long as the Group Netlist hasn't changed.
+    With VerifyPolicy.hash, the names in a Group Netlist with a matching content hash are trusted and not validated.
+    """
+    with span("read"):
+        with open(group_netlist_path, "rb") as group_netlist_file:
+            document = group_netlist_file.read()
+
+    if not use_cache:
+        return _parse_and_verify(document, verify)[0]
+
+    with span("load cache"):
+        document_hash = hashlib.sha256(document).hexdigest()
+        cache_path = _get_parse_cache_path(group_netlist_path, cache_dir, document_hash)
+        cached = _load_parse_cache(cache_path, document_hash)
+    if cached is not None:
+        verified, group_netlist = cached
+        # The file is exactly the one that was checked before.
+        # We only need to check again when asked for a stronger check.
+        if VERIFY_STRENGTH[verify] > VERIFY_STRENGTH[verified]:
+            with span("verify"):
+                passed = _verify(group_netlist, document, verify)
+            if passed:
+                # Remember the stronger check so that the next run doesn't repeat it.
+                with span("store cache"):
+                    _store_parse_cache(cache_path, document_hash, verify, group_netlist)
+        return group_netlist
 
+    group_netlist, passed = _parse_and_verify(document, verify)
+    with span("store cache"):
+        _store_parse_cache(
+            cache_path,
+            document_hash,
+            verify if passed else VerifyPolicy.off,
+            group_netlist,
+        )
     return group_netlist
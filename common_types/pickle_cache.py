@@ -0,0 +1,60 @@
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Tuple, TypeVar
+
+# A cache file holds two pickles: a small header that says whether the cache is still usable and the payload.
+
+Header = TypeVar("Header")
+
+
+def load_pickle_cache(
+    cache_path: Path, read_header: Callable[[Any], Header | None]
+) -> Tuple[Header, Any] | None:
+    """
+    Load a cache written by `store_pickle_cache`.
+    `read_header` returns None for the header of a stale cache, then the payload isn't unpickled.
+    Return None when there is no usable cache.
+    """
+    try:
+        with open(cache_path, "rb") as cache_file:
+            # Read the small header first so that stale caches are rejected cheaply.
+            header = read_header(pickle.load(cache_file))
+            if header is None:
+                return None
+            return header, pickle.load(cache_file)
+    except Exception:
+        # The cache is missing, corrupt or was written by an incompatible version.
+        return None
+
+
+def store_pickle_cache(
+    cache_path: Path, header: Any, payload: Any, description: str
+) -> None:
+    """
+    Only warn when the cache can't be written because the cache is just an optimization.
+    """
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_path.parent, prefix=cache_path.name, delete=False
+        ) as tmp:
+            tmp_path = Path(tmp.name)
+        # Write to a temporary file first so that no one ever reads a half-written cache.
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                pickle.dump(header, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(payload, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(cache_path)
+        except BaseException:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+    except OSError as error:
+        print(
+            f"Warning: Could not write the {description} {cache_path}: {error}",
+            file=sys.stderr,
+        )
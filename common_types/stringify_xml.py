@@ -1,122 +1,285 @@
-import xml.etree.ElementTree as ET
+import hashlib
+import io
 from datetime import datetime
 from pathlib import Path
-from typing import List, Set
+from typing import BinaryIO, List, Set, Tuple
 
 from common_types.group_types import (
     GroupNetlist,
     Group,
     GroupNet,
 )
+from common_types.output_file import open_output_if_changed
 
 XML_WARNING = "WARNING: This file has been automatically generated. Do not edit!"
+CONTENT_HASH_TAG = "contentHash"
+ROOT_TAG = "groupNetlist"
+INDENT = "    "
+"""
+Write the buffered lines to the file once there are this many.
+"""
+FLUSH_LINES = 4096
 
+"""
+All attributes of a node in the order they are written in.
+"""
+NodeAttributes = Tuple[str, str, str, str]
 
-def _xmlify_group(
-    group: Group,
-    tag_name: str,
-) -> ET.Element:
-    root = ET.Element(tag_name)
-    root.set("schematic", group.schematic)
-    root.set("path", group.path)
-    root.set("type", group.group_type)
 
-    group_map_fields = ET.SubElement(root, "groupMapFields")
-    for key, value in group.group_map_fields.items():
-        group_map_field = ET.SubElement(group_map_fields, "groupMapField")
-        group_map_field.set("name", key)
-        group_map_field.text = value
+def _escape_text(text: str) -> str:
+    # This escapes exactly like ElementTree.
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attribute(value: str) -> str:
+    # This escapes exactly like ElementTree.
+    value = _escape_text(value)
+    if '"' in value:
+        value = value.replace('"', "&quot;")
+    if "\r" in value:
+        value = value.replace("\r", "&#13;")
+    if "\n" in value:
+        value = value.replace("\n", "&#10;")
+    if "\t" in value:
+        value = value.replace("\t", "&#09;")
+    return value
+
+
+def _text_element(tag_name: str, attributes: str, text: str) -> str:
+    if len(text) == 0:
+        return f"<{tag_name}{attributes} />"
+    return f"<{tag_name}{attributes}>{_escape_text(text)}</{tag_name}>"
+
+
+class _XmlWriter:
+    """
+    Buffer lines of XML and write them to a binary file.
+    Everything but what is written with write_unhashed is part of the content hash.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._lines: List[str] = []
+        self.hasher = hashlib.sha256()
+
+    def write(self, text: str) -> None:
+        self._lines.append(text)
+        if len(self._lines) >= FLUSH_LINES:
+            self.flush()
+
+    def write_unhashed(self, text: str) -> None:
+        self.flush()
+        self._file.write(text.encode("utf-8"))
+
+    def flush(self) -> None:
+        chunk = "".join(self._lines).encode("utf-8")
+        self._lines.clear()
+        self.hasher.update(chunk)
+        self._file.write(chunk)
+
+
+def _write_header(
+    writer: _XmlWriter, sources: Set[Path], date: datetime, tool: str
+) -> None:
+    writer.write("<?xml version='1.0' encoding='utf-8'?>\n")
+    writer.write(f"<{ROOT_TAG}>\n")
+    writer.write(f"{INDENT}<!--{_escape_text(XML_WARNING)}-->\n")
+    writer.write(f"{INDENT}<netlist>\n")
+
+    sources_list = list(sources)
+    sources_list.sort()
+    if len(sources_list) == 0:
+        writer.write(f"{INDENT * 2}<sources />\n")
+    else:
+        writer.write(f"{INDENT * 2}<sources>\n")
+        for source in sources_list:
+            writer.write(f"{INDENT * 3}{_text_element('source', '', str(source))}\n")
+        writer.write(f"{INDENT * 2}</sources>\n")
+
+    # The date is not part of the content hash.
+    writer.write(INDENT * 2)
+    writer.write_unhashed(_text_element("date", "", date.isoformat()))
+    writer.write("\n")
+    writer.write(f"{INDENT * 2}{_text_element('tool', '', tool)}\n")
+    writer.write(f"{INDENT}</netlist>\n")
+
+
+def _write_group(writer: _XmlWriter, group: Group) -> None:
+    writer.write(
+        f'{INDENT * 2}<group schematic="{_escape_attribute(group.schematic)}" '
+        f'path="{_escape_attribute(group.path)}" '
+        f'type="{_escape_attribute(group.group_type)}">\n'
+    )
+
+    if len(group.group_map_fields) == 0:
+        writer.write(f"{INDENT * 3}<groupMapFields />\n")
+    else:
+        writer.write(f"{INDENT * 3}<groupMapFields>\n")
+        for key, value in group.group_map_fields.items():
+            field = _text_element(
+                "groupMapField", f' name="{_escape_attribute(key)}"', value
+            )
+            writer.write(f"{INDENT * 4}{field}\n")
+        writer.write(f"{INDENT * 3}</groupMapFields>\n")
 
-    xml_pins = ET.SubElement(root, "pins")
     # Ensure xml is deterministic.
     pins = list(group.pins)
     pins.sort()
-    for name in pins:
-        pin = ET.SubElement(xml_pins, "pin")
-        pin.set("name", name)
-    return root
+    if len(pins) == 0:
+        writer.write(f"{INDENT * 3}<pins />\n")
+    else:
+        writer.write(f"{INDENT * 3}<pins>\n")
+        for name in pins:
+            writer.write(f'{INDENT * 4}<pin name="{_escape_attribute(name)}" />\n')
+        writer.write(f"{INDENT * 3}</pins>\n")
 
+    writer.write(f"{INDENT * 2}</group>\n")
 
-def _xmlify_groups(
-    groups: List[Group],
-    tag_name: str,
-) -> ET.Element:
-    xml_groups = ET.Element(tag_name)
+
+def _write_groups(writer: _XmlWriter, groups: List[Group]) -> None:
+    if len(groups) == 0:
+        writer.write(f"{INDENT}<groups />\n")
+        return
+    writer.write(f"{INDENT}<groups>\n")
     # Ensure xml is deterministic.
     groups.sort(key=lambda s: s.get_id())
     for group in groups:
-        xml_group = _xmlify_group(group, "group")
-        xml_groups.append(xml_group)
-    return xml_groups
+        _write_group(writer, group)
+    writer.write(f"{INDENT}</groups>\n")
 
 
-def _xmlify_net(net: GroupNet, tag_name: str) -> ET.Element:
-    xml_net = ET.Element(tag_name)
+def _escape_net(net: GroupNet) -> List[NodeAttributes]:
     # Ensure xml is deterministic.
     nodes = list(net)
     nodes.sort()
-    for node in nodes:
-        xml_node = ET.SubElement(xml_net, "node")
-        xml_node.set("schematic", node.group_id.schematic)
-        xml_node.set("path", node.group_id.path)
-        xml_node.set("type", node.group_id.group_type)
-        xml_node.set("pin", node.pin)
-    return xml_net
+    return [
+        (
+            _escape_attribute(node.group_id.schematic),
+            _escape_attribute(node.group_id.path),
+            _escape_attribute(node.group_id.group_type),
+            _escape_attribute(node.pin),
+        )
+        for node in nodes
+    ]
+
+
+def _net_sort_key(net: List[NodeAttributes]) -> Tuple[str, ...]:
+    """
+    Nets are ordered like their unindented XML representations.
+    Every attribute is followed by the closing quote just like in the XML.
+    That way an attribute that is the prefix of another one is ordered the same as in the XML.
+    """
+    return tuple(
+        attribute + '"' for node_attributes in net for attribute in node_attributes
+    )
 
 
-def _xmlify_nets(nets: List[GroupNet], tag_name: str) -> ET.Element:
-    xml_nets = ET.Element(tag_name)
+def _write_nets(writer: _XmlWriter, nets: List[GroupNet]) -> None:
+    if len(nets) == 0:
+        writer.write(f"{INDENT}<nets />\n")
+        return
+    writer.write(f"{INDENT}<nets>\n")
+    escaped_nets = [_escape_net(net) for net in nets]
     # Ensure xml is deterministic.
-    nets.sort(key=lambda n: bytes(ET.tostring(_xmlify_net(n, "net"), encoding="utf-8")))
-    for net in nets:
-        xml_net = _xmlify_net(net, "net")
-        xml_nets.append(xml_net)
-    return xml_nets
-
-
-def _create_xml_root(
-    sources: Set[Path], date: datetime, tool: str, tag_name: str
-) -> ET.Element:
-    root = ET.Element(tag_name)
-    warning_comment = ET.Comment(XML_WARNING)
-    root.append(warning_comment)
-
-    netlist = ET.SubElement(root, "netlist")
-    sources_tag = ET.SubElement(netlist, "sources")
-    sources_list = list(sources)
-    sources_list.sort()
-    for source in sources_list:
-        source_tag = ET.SubElement(sources_tag, "source")
-        source_tag.text = str(source)
+    escaped_nets.sort(key=_net_sort_key)
+    for escaped_net in escaped_nets:
+        writer.write(f"{INDENT * 2}<net>\n")
+        for schematic, path, group_type, pin in escaped_net:
+            writer.write(
+                f'{INDENT * 3}<node schematic="{schematic}" path="{path}" '
+                f'type="{group_type}" pin="{pin}" />\n'
+            )
+        writer.write(f"{INDENT * 2}</net>\n")
+    writer.write(f"{INDENT}</nets>\n")
+
 
-    date_tag = ET.SubElement(netlist, "date")
-    date_tag.text = date.isoformat()
-    tool_tag = ET.SubElement(netlist, "tool")
-    tool_tag.text = tool
+def content_hash(document: bytes) -> str:
+    """
+    Hash a stringified group netlist without its content hash.
+    The date is not part of the hash, so the hash only changes when the content does.
+    """
+    date_start = document.index(b"<date>")
+    date_end = document.index(b"</date>", date_start) + len(b"</date>")
+    hasher = hashlib.sha256()
+    hasher.update(document[:date_start])
+    hasher.update(document[date_end:])
+    return hasher.hexdigest()
 
-    return root
 
+def split_content_hash(document: bytes) -> Tuple[bytes, str | None]:
+    """
+    Split a stringified group netlist into the document without the content hash and the content hash.
+    The content hash is None when the document doesn't have one.
+    """
+    start_tag = f"{INDENT}<{CONTENT_HASH_TAG}>".encode()
+    end_tag = f"</{CONTENT_HASH_TAG}>\n".encode()
+    start = document.rfind(start_tag)
+    if start == -1:
+        return document, None
+    end = document.find(end_tag, start)
+    if end == -1:
+        return document, None
+    digest = document[start + len(start_tag) : end].decode()
+    return document[:start] + document[end + len(end_tag) :], digest
 
-def _stringify_xml(element: ET.Element) -> bytes:
-    ET.indent(element, space="    ", level=0)
-    return bytes(
-        ET.tostring(element, encoding="utf-8", method="xml", xml_declaration=True)
+
+def write_group_netlist(group_netlist: GroupNetlist, file: BinaryIO) -> str:
+    """
+    Write the group netlist as XML to `file` and return its content hash.
+    Groups and nets are written one after the other without ever building the whole document in memory.
+    """
+    writer = _XmlWriter(file)
+    _write_header(writer, group_netlist.sources, group_netlist.date, group_netlist.tool)
+    _write_groups(writer, list(group_netlist.groups.values()))
+    assert GroupNet(frozenset()) not in group_netlist.nets
+    _write_nets(writer, list(group_netlist.nets))
+    writer.flush()
+
+    # The content hash covers the closing root tag, too.
+    root_end = f"</{ROOT_TAG}>"
+    writer.hasher.update(root_end.encode("utf-8"))
+    digest = writer.hasher.hexdigest()
+    writer.write_unhashed(
+        f"{INDENT}<{CONTENT_HASH_TAG}>{digest}</{CONTENT_HASH_TAG}>\n"
     )
+    writer.write_unhashed(root_end)
+    return digest
+
+
+def _get_file_content_hash(netlist_path: Path) -> str | None:
+    """
+    Compute the content hash of a written group netlist from its content, ignoring the embedded one.
+    Return None when the file is no group netlist written by us.
+    """
+    try:
+        with open(netlist_path, "rb") as netlist_file:
+            document, _ = split_content_hash(netlist_file.read())
+        return content_hash(document)
+    except (OSError, ValueError):
+        return None
+
+
+def write_group_netlist_file(group_netlist: GroupNetlist, output_path: Path) -> str:
+    """
+    Write the group netlist to `output_path` and return its content hash.
+    An existing file with the same content hash is kept as it is, including its date.
+    """
+    digest = ""
+    with open_output_if_changed(
+        output_path,
+        lambda _, old_path: digest == _get_file_content_hash(old_path),
+    ) as file:
+        digest = write_group_netlist(group_netlist, file)
+    return digest
 
 
 def stringify_group_netlist(group_netlist: GroupNetlist) -> bytes:
-    root = _create_xml_root(
-        group_netlist.sources,
-        group_netlist.date,
-        group_netlist.tool,
-        "groupNetlist",
-    )
-    root.append(
-        _xmlify_groups(
-            list(group_netlist.groups.values()),
-            "groups",
-        )
-    )
-    assert GroupNet(frozenset()) not in group_netlist.nets
-    root.append(_xmlify_nets(list(group_netlist.nets), "nets"))
-    return _stringify_xml(root)
+    output = io.BytesIO()
+    write_group_netlist(group_netlist, output)
+    return output.getvalue()
@@ -1,21 +1,41 @@
 import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import FrozenSet, Set
+from typing import Dict, FrozenSet, List, Set, Tuple
 from enum import Enum
 
 from common_types.group_types import (
+    GlobalGroupPinIdentifier,
     GroupGlob,
     GroupIdentifier,
     GroupNet,
     GroupNetlist,
+    CompactGroupNetlist,
     GroupPinName,
+    compact_group_netlist,
     compile_group_glob,
-    does_match_pattern,
+    expand_group_netlist,
     stringify_group_id,
 )
-from common_types.parse_xml import parse_group_netlist
-from common_types.stringify_xml import stringify_group_netlist
+from common_types.instrumentation import (
+    PROFILE_HELP,
+    PROFILE_MEMORY_HELP,
+    STATS_JSON_HELP,
+    count_netlist,
+    enable_instrumentation,
+    report_instrumentation,
+    set_count,
+    span,
+)
+from common_types.parse_xml import (
+    PARSE_CACHE_DIR_HELP,
+    PARSE_CACHE_HELP,
+    VERIFY_POLICY_HELP,
+    VerifyPolicy,
+    parse_group_netlist,
+)
+from common_types.stringify_xml import write_group_netlist, write_group_netlist_file
 
 TOOL_NAME = "group_netlist_merger v0.1.0"
 TOOL_NAME_WITH_VERSION = f"{TOOL_NAME} v0.1.0"
@@ -29,8 +49,95 @@ class PinMapper(Enum):
         return self.value
 
 
-def _merge_group_netlists(netlists: Set[GroupNetlist]) -> GroupNetlist:
-    netlists_list = list(netlists)
+class _DisjointSet:
+    """
+    Union-find over the integers 0 to size-1.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._parents = list(range(size))
+        self._sizes = [1] * size
+
+    def find(self, element: int) -> int:
+        root = element
+        while self._parents[root] != root:
+            root = self._parents[root]
+        # Compress the path.
+        while self._parents[element] != root:
+            self._parents[element], element = root, self._parents[element]
+        return root
+
+    def union(self, element_a: int, element_b: int) -> None:
+        root_a = self.find(element_a)
+        root_b = self.find(element_b)
+        if root_a == root_b:
+            return
+        # Attach the smaller tree to the larger one.
+        if self._sizes[root_a] < self._sizes[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parents[root_b] = root_a
+        self._sizes[root_a] += self._sizes[root_b]
+
+
+def _pin_number(pin: GroupPinName) -> int:
+    try:
+        return int(pin)
+    except ValueError:
+        print(
+            f"Error: The pin_mapper {PinMapper.even_odd} needs numerical pins but {pin} is not numerical.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+def _parse_compact_group_netlist(
+    netlist_path: Path,
+    verify: VerifyPolicy,
+    parse_cache: bool,
+    parse_cache_dir: Path | None,
+) -> CompactGroupNetlist:
+    """
+    Parse a Group Netlist in a worker process.
+    """
+    return compact_group_netlist(
+        parse_group_netlist(netlist_path, verify, parse_cache, parse_cache_dir)
+    )
+
+
+def _parse_group_netlists(
+    netlist_paths: List[Path],
+    jobs: int,
+    verify: VerifyPolicy,
+    parse_cache: bool,
+    parse_cache_dir: Path | None,
+) -> List[GroupNetlist]:
+    """
+    Parse all Group Netlists, with more than one job in parallel on a process pool.
+    The Group Netlists are returned in the order of `netlist_paths`.
+    """
+    if jobs <= 1 or len(netlist_paths) <= 1:
+        return [
+            parse_group_netlist(netlist_path, verify, parse_cache, parse_cache_dir)
+            for netlist_path in netlist_paths
+        ]
+
+    # Parsing in other processes doesn't add to the phases and counts.
+    with ProcessPoolExecutor(max_workers=min(jobs, len(netlist_paths))) as executor:
+        futures = [
+            executor.submit(
+                _parse_compact_group_netlist,
+                netlist_path,
+                verify,
+                parse_cache,
+                parse_cache_dir,
+            )
+            for netlist_path in netlist_paths
+        ]
+        # Expand the first Group Netlists while the others are still being parsed.
+        return [expand_group_netlist(future.result()) for future in futures]
+
+
+def _merge_group_netlists(netlists_list: List[GroupNetlist]) -> GroupNetlist:
     assert len(netlists_list) > 0
     netlist = netlists_list[0]
     for new_netlist in netlists_list[1:]:
@@ -52,13 +159,14 @@ def _connect_netlist(
     to_connect_group_sets: Set[FrozenSet[GroupIdentifier]] = set()
     for connect_group_glob in connect_group_globs:
         to_connect_group_set: Set[GroupIdentifier] = set()
-        for group_id in netlist.groups:
-            if not does_match_pattern(connect_group_glob, group_id):
-                continue
+        first_group_id: GroupIdentifier | None = None
+        for group_id in connect_group_glob.filter(netlist.groups):
             # Ensure we only connect groups that can be connected.
-            if len(to_connect_group_set) != 0:
+            if first_group_id is None:
+                first_group_id = group_id
+            else:
                 group = netlist.groups[group_id]
-                other_group = netlist.groups[list(to_connect_group_set)[0]]
+                other_group = netlist.groups[first_group_id]
                 if set(other_group.pins) != set(group.pins):
                     print(
                         f"Error: The connect group glob pattern {connect_group_glob} matches both {stringify_group_id(group.get_id())} and {stringify_group_id(other_group.get_id())} but they don't have the same pins.",
@@ -86,71 +194,68 @@ def _connect_netlist(
                 # 3 <-> 4
                 # 4 <-> 3
                 # ...
-                try:
-                    num_a = int(pin_a)
-                    num_b = int(pin_b)
-                except ValueError:
-                    print(
-                        f"Error: The pin_mapper {PinMapper.even_odd} needs numerical pins but {pin_a} and/or {pin_b} are not numerical.",
-                        file=sys.stderr,
-                    )
-                    sys.exit(1)
-
+                num_a = _pin_number(pin_a)
+                num_b = _pin_number(pin_b)
                 if num_a % 2 == 1:
                     return num_a + 1 == num_b
                 if num_b % 2 == 1:
                     return num_b + 1 == num_a
                 return False
 
-    # This relation should be transitive but isn't.
-    # We implement the transitive nature further down.
-    # This could be implemented a lot faster but this is a lot simpler and easier to manually verify.
-    def should_nets_be_merged(net_a: GroupNet, net_b: GroupNet) -> bool:
-        if net_a == net_b:
-            return True
-        # We need a group_set that connects the two nets.
-        # Loop through all to find one.
-        for group_set in to_connect_group_sets:
-            # We need a node in the net_a that should be connected to a node in net_b.
-            for node_a in net_a:
-                if node_a.group_id not in group_set:
-                    # The node is not of a group that should be connected.
+    def pin_bucket(pin: GroupPinName) -> GroupPinName | int:
+        """
+        Two pins can only connect when they are in the same bucket.
+        """
+        match pin_mapper:
+            case PinMapper.equal:
+                return pin
+            case PinMapper.even_odd:
+                # 1 and 2 are in bucket 1, 3 and 4 in bucket 2, ...
+                return (_pin_number(pin) + 1) // 2
+
+    # Index every node of a group that should be connected by its group set and pin bucket.
+    # Only nodes in the same bucket can connect.
+    # A bucket holds at most two nodes per group in its group set, so checking every pair in a bucket is cheap.
+    nets = list(netlist.nets)
+    group_to_sets: Dict[GroupIdentifier, List[int]] = dict()
+    for set_index, group_set in enumerate(to_connect_group_sets):
+        if len(group_set) < 2:
+            # There is nothing to connect.
+            continue
+        for group_id in group_set:
+            group_to_sets.setdefault(group_id, []).append(set_index)
+    buckets: Dict[
+        Tuple[int, GroupPinName | int], List[Tuple[GlobalGroupPinIdentifier, int]]
+    ] = dict()
+    for net_index, net in enumerate(nets):
+        for node in net:
+            for set_index in group_to_sets.get(node.group_id, []):
+                bucket = buckets.setdefault((set_index, pin_bucket(node.pin)), [])
+                bucket.append((node, net_index))
+
+    # Two nets should be merged if they have nodes of different groups in the same group set whose pins should connect.
+    # Merging is transitive: when a should be merged with b and b with c, all three become one net.
+    net_sets = _DisjointSet(len(nets))
+    for bucket in buckets.values():
+        for index_a, (node_a, net_a) in enumerate(bucket):
+            for node_b, net_b in bucket[index_a + 1 :]:
+                if node_a.group_id == node_b.group_id:
+                    # Do not connect a group to itself.
+                    # This would be a problem with even_odd pin mapping.
                     continue
-                for node_b in net_b:
-                    if node_b.group_id not in group_set:
-                        # The node is not of a group that should be connected.
-                        continue
-                    if node_a.group_id == node_b.group_id:
-                        # Do not connect a group to itself.
-                        # This would be a problem with even_odd pin mapping.
-                        continue
-                    if not should_pins_connect(node_b.pin, node_a.pin):
-                        # The pins of node_a and node_b aren't the same -> don't connect.
-                        continue
-                    return True
-        return False
-
-    out_nets: Set[GroupNet] = set()
-    # We go through all nets and check if any other nets should be merged with it.
-    # This works great with the non-transitive predicate from above.
-    # An alternative would be a breadth-first search but that is more complicated.
-    for net in netlist.nets:
-        unioned = False
-        # Should this net be unioned instead of appended?
-        for out_net in out_nets:
-            assert should_nets_be_merged(net, out_net) == should_nets_be_merged(
-                out_net, net
-            )
-            if should_nets_be_merged(net, out_net):
-                # Update the old net with the new nodes.
-                out_nets.remove(out_net)
-                out_nets.add(GroupNet(out_net | net))
-                unioned = True
-                break
-        if not unioned:
-            out_nets.add(net)
-
-    netlist.nets = out_nets
+                if should_pins_connect(node_a.pin, node_b.pin):
+                    net_sets.union(net_a, net_b)
+
+    merged_nets: Dict[int, List[GroupNet]] = dict()
+    for net_index, net in enumerate(nets):
+        merged_nets.setdefault(net_sets.find(net_index), []).append(net)
+    netlist.nets = {
+        # Most nets aren't merged with anything; keep those as they are.
+        nets_to_merge[0]
+        if len(nets_to_merge) == 1
+        else GroupNet(frozenset().union(*nets_to_merge))
+        for nets_to_merge in merged_nets.values()
+    }
     return netlist
 
 
@@ -159,33 +264,42 @@ def merge_group_netlists(
     connect_group_globs: Set[GroupGlob],
     output_path: Path | None,
     netlist_paths: Set[Path],
+    verify: VerifyPolicy = VerifyPolicy.hash,
+    parse_cache: bool = False,
+    parse_cache_dir: Path | None = None,
+    jobs: int = 1,
 ) -> None:
     """
     This function does the same and has the same parameters as the group_netlist_merger CLI interface.
     """
 
-    netlists: Set[GroupNetlist] = set()
-    for netlist_path in netlist_paths:
-        netlist = parse_group_netlist(netlist_path)
-        for other_netlist in netlists:
-            assert len(other_netlist.sources & netlist.sources) == 0
-        netlists.add(netlist)
+    with span("parse"):
+        # Sort the paths so that the merge order doesn't depend on how they were given.
+        netlists = _parse_group_netlists(
+            sorted(netlist_paths), jobs, verify, parse_cache, parse_cache_dir
+        )
+        for netlist_index, netlist in enumerate(netlists):
+            for other_netlist in netlists[:netlist_index]:
+                assert len(other_netlist.sources & netlist.sources) == 0
 
-    merged_group_netlist = _merge_group_netlists(
-        netlists,
-    )
-    connected_merged_group_netlist = _connect_netlist(
-        merged_group_netlist,
-        connect_group_globs,
-        pin_mapper,
-    )
-    output = stringify_group_netlist(connected_merged_group_netlist)
-    if output_path is not None:
-        print(f"Printing output to: {output_path}")
-        with open(output_path, "wb") as file:
-            file.write(output)
-    else:
-        sys.stdout.buffer.write(output)
+    with span("merge"):
+        merged_group_netlist = _merge_group_netlists(
+            netlists,
+        )
+    count_netlist(merged_group_netlist.groups, merged_group_netlist.nets)
+    with span("connect"):
+        connected_merged_group_netlist = _connect_netlist(
+            merged_group_netlist,
+            connect_group_globs,
+            pin_mapper,
+        )
+    set_count("connected nets", len(connected_merged_group_netlist.nets))
+    with span("write"):
+        if output_path is not None:
+            print(f"Printing output to: {output_path}")
+            write_group_netlist_file(connected_merged_group_netlist, output_path)
+        else:
+            write_group_netlist(connected_merged_group_netlist, sys.stdout.buffer)
 
 
 def main() -> None:
@@ -215,12 +329,50 @@ def main() -> None:
         "--output",
         help="The output path. Print to stdout if not provided.",
     )
+    parser.add_argument(
+        "--verify",
+        help=VERIFY_POLICY_HELP,
+        type=VerifyPolicy,
+        choices=list(VerifyPolicy),
+        default=VerifyPolicy.hash,
+    )
+    parser.add_argument(
+        "--parse-cache",
+        help=PARSE_CACHE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--parse-cache-dir",
+        help=PARSE_CACHE_DIR_HELP,
+    )
+    parser.add_argument(
+        "--jobs",
+        help="How many Group Netlists to parse in parallel.",
+        type=int,
+        default=1,
+    )
     parser.add_argument(
         "group_netlist_file",
         help="The path to a Group Netlist files. You may provide multiple.",
         nargs="+",
     )
+    parser.add_argument(
+        "--profile",
+        help=PROFILE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats-json",
+        help=STATS_JSON_HELP,
+    )
+    parser.add_argument(
+        "--profile-memory",
+        help=PROFILE_MEMORY_HELP,
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.profile or args.stats_json is not None or args.profile_memory:
+        enable_instrumentation(args.profile_memory)
 
     merge_group_netlists(
         args.pin_mapper,
@@ -229,6 +381,14 @@ def main() -> None:
         else {compile_group_glob(group_glob) for group_glob in args.connect_group_glob},
         None if args.output is None else Path(args.output),
         {Path(path) for path in args.group_netlist_file},
+        args.verify,
+        args.parse_cache or args.parse_cache_dir is not None,
+        None if args.parse_cache_dir is None else Path(args.parse_cache_dir),
+        args.jobs,
+    )
+    report_instrumentation(
+        args.profile or args.profile_memory,
+        None if args.stats_json is None else Path(args.stats_json),
     )
 
 
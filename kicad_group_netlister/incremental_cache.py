@@ -0,0 +1,115 @@
+from pathlib import Path
+from typing import Dict, FrozenSet, NewType, Tuple
+
+from common_types.group_types import Group, GroupIdentifier, GroupNet, Schematic
+from common_types.pickle_cache import load_pickle_cache, store_pickle_cache
+from kicad_group_netlister.kicad_types import (
+    GroupsReverseLookup,
+    KiCadComponent,
+    KiCadComponentRef,
+    KiCadNet,
+    KiCadNodePinFunction,
+    KiCadNodePinName,
+    KiCadSheetPath,
+)
+
+"""
+Change this whenever the cached representation changes to ignore old caches.
+"""
+INCREMENTAL_CACHE_VERSION = "kicad_firmware_generation v0.1.0, incremental cache v1"
+
+INCREMENTAL_CACHE_HELP = (
+    "Remember the Group Netlist and what it was created from in this file. "
+    "The next run only recomputes the groups whose components, fields or connected nets changed and reuses the rest. "
+    "The output is the same as without this flag. "
+    "Only use caches you trust; they are Python pickles."
+)
+
+"""
+Everything about a component that decides what group it belongs to and what its group looks like.
+"""
+ComponentFingerprint = NewType(
+    "ComponentFingerprint", Tuple[KiCadSheetPath, Tuple[Tuple[str, str], ...]]
+)
+"""
+A KiCad net by value: the nodes it connects.
+"""
+NetFingerprint = NewType(
+    "NetFingerprint",
+    FrozenSet[Tuple[KiCadComponentRef, KiCadNodePinName, KiCadNodePinFunction]],
+)
+
+
+def fingerprint_component(component: KiCadComponent) -> ComponentFingerprint:
+    return ComponentFingerprint((
+        component.sheetpath,
+        tuple(sorted(component.fields.items())),
+    ))
+
+
+def fingerprint_net(net: KiCadNet) -> NetFingerprint:
+    return NetFingerprint(
+        frozenset((node.ref, node.pin, node.pinfunction) for node in net)
+    )
+
+
+class IncrementalCache:
+    """
+    What one kicad_group_netlister run created and what from.
+    """
+
+    lenient_names: bool
+    schematic: Schematic
+    """
+    The content hash of the Group Netlist this run wrote.
+    """
+    output_hash: str
+    component_fingerprints: Dict[KiCadComponentRef, ComponentFingerprint]
+    """
+    Map component's ref to the group it belonged to.
+    Components that didn't belong to a group don't appear in this dict.
+    """
+    groups_reverse_lookup: GroupsReverseLookup
+    groups: Dict[GroupIdentifier, Group]
+    """
+    Map each KiCad net to the Group Net it was translated into.
+    Nets that don't connect any group pin map to None.
+    """
+    nets: Dict[NetFingerprint, GroupNet | None]
+
+
+def create_empty_incremental_cache() -> IncrementalCache:
+    """
+    Create a cache that doesn't know any component or net, so that everything is recomputed.
+    """
+    cache = IncrementalCache()
+    cache.lenient_names = False
+    cache.schematic = Schematic("")
+    cache.output_hash = ""
+    cache.component_fingerprints = dict()
+    cache.groups_reverse_lookup = GroupsReverseLookup(dict())
+    cache.groups = dict()
+    cache.nets = dict()
+    return cache
+
+
+def load_incremental_cache(cache_path: Path) -> IncrementalCache | None:
+    """
+    Return None when there is no usable cache.
+    """
+    cached = load_pickle_cache(
+        cache_path,
+        lambda version: version if version == INCREMENTAL_CACHE_VERSION else None,
+    )
+    if cached is None:
+        return None
+    cache = cached[1]
+    if not isinstance(cache, IncrementalCache):
+        return None
+    return cache
+
+
+def store_incremental_cache(cache_path: Path, cache: IncrementalCache) -> None:
+    store_pickle_cache(
+        cache_path, INCREMENTAL_CACHE_VERSION, cache, "incremental cache"
+    )
@@ -1,8 +1,11 @@
 import argparse
+import json
 import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Set, Tuple
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
 
 from common_types.group_types import (
     GlobalGroupPinIdentifier,
@@ -15,15 +18,43 @@ from common_types.group_types import (
     assert_is_group_path,
     assert_is_group_type,
     assert_is_pin_name,
+    reset_name_warnings,
     stringify_group_id,
 )
-from common_types.stringify_xml import stringify_group_netlist
+from common_types.instrumentation import (
+    PROFILE_HELP,
+    PROFILE_MEMORY_HELP,
+    STATS_JSON_HELP,
+    count_netlist,
+    enable_instrumentation,
+    report_instrumentation,
+    set_count,
+    span,
+)
+from common_types.stringify_xml import (
+    split_content_hash,
+    write_group_netlist,
+    write_group_netlist_file,
+)
+from kicad_group_netlister.incremental_cache import (
+    INCREMENTAL_CACHE_HELP,
+    ComponentFingerprint,
+    IncrementalCache,
+    NetFingerprint,
+    create_empty_incremental_cache,
+    fingerprint_component,
+    fingerprint_net,
+    load_incremental_cache,
+    store_incremental_cache,
+)
 from kicad_group_netlister.kicad_netlist_xml import parse_kicad_netlist
+from kicad_group_netlister.kicad_schematic import parse_kicad_schematic
 from kicad_group_netlister.kicad_types import (
     GlobalKiCadPinIdentifier,
     GroupPinNameLookups,
     GroupsReverseLookup,
     KiCadComponentRef,
+    KiCadNet,
     KiCadNetlist,
     KiCadNodePinName,
     KiCadSheetPath,
@@ -113,6 +144,8 @@ def _get_explicit_pin_name_lookups(
     lenient_names: bool,
 ) -> GroupPinNameLookups:
     explicit_pin_namings = GroupPinNameLookups(dict())
+    # All pins in any of the explicit_pin_namings.
+    explicitly_named_pins: Set[GlobalKiCadPinIdentifier] = set()
     for group_identifier, raw_group in groups_lookup.items():
         # Use this set to verify no GroupPin name is used twice for the same group.
         group_pin_names: Set[GroupPinName] = set()
@@ -131,8 +164,8 @@ def _get_explicit_pin_name_lookups(
                     node_pin_name,
                 )
                 # We can't have the same globally unique reference for two pins.
-                for other_expicit_in_naming_group in explicit_pin_namings.values():
-                    assert global_pin_identifier not in other_expicit_in_naming_group
+                assert global_pin_identifier not in explicitly_named_pins
+                explicitly_named_pins.add(global_pin_identifier)
 
                 # This is the name the user explicitly set for this pin.
                 group_pin_name = assert_is_pin_name(field_value, lenient=lenient_names)
@@ -156,31 +189,10 @@ def _get_explicit_pin_name_lookups(
     return explicit_pin_namings
 
 
-# The KiCad netlist connects pins on components to other pins on other components.
-# This function converts that netlist into a netlist that connects pins on groups to other pins on other groups.
-# The names of the pins are the GroupPin names and not the KiCad pin names any longer.
-def _gen_group_netlist(
-    netlist: KiCadNetlist,
-    raw_groups_lookup: RawGroupLookup,
-    groups_reverse_lookup: GroupsReverseLookup,
-    lenient_names: bool,
-) -> GroupNetlist:
-    explicit_pin_name_lookups = _get_explicit_pin_name_lookups(
-        raw_groups_lookup, lenient_names
-    )
-
-    # We only use this to check that no two components have the same global group pin identifier.
-    global_group_pin_to_component: Dict[GlobalGroupPinIdentifier, KiCadComponentRef] = (
-        dict()
-    )
-
-    group_netlist = GroupNetlist()
-    group_netlist.sources = {netlist.source}
-    group_netlist.date = datetime.now()
-    group_netlist.tool = TOOL_NAME_WITH_VERSION
-
-    # Create representations for all groups without their pins.
-    # same as raw_groups_lookup but this time with the final Group class
+def _create_groups(raw_groups_lookup: RawGroupLookup) -> Dict[GroupIdentifier, Group]:
+    """
+    Create representations for all groups without their pins.
+    """
     groups_lookup: Dict[GroupIdentifier, Group] = dict()
     for raw_group in raw_groups_lookup.values():
         group = Group()
@@ -193,9 +205,28 @@ def _gen_group_netlist(
         group_id = raw_group.get_id()
         assert group_id not in groups_lookup
         groups_lookup[group_id] = group
+    return groups_lookup
+
+
+# The KiCad netlist connects pins on components to other pins on other components.
+# This function converts these nets into nets that connect pins on groups to other pins on other groups.
+# The names of the pins are the GroupPin names and not the KiCad pin names any longer.
+# The pins are added to the groups in groups_lookup.
+# There is one Group Net for each KiCad net, None when the net doesn't connect any group pin.
+def _translate_nets(
+    nets: Iterable[KiCadNet],
+    groups_lookup: Dict[GroupIdentifier, Group],
+    groups_reverse_lookup: GroupsReverseLookup,
+    explicit_pin_name_lookups: GroupPinNameLookups,
+    lenient_names: bool,
+) -> List[GroupNet | None]:
+    # We only use this to check that no two components have the same global group pin identifier.
+    global_group_pin_to_component: Dict[GlobalGroupPinIdentifier, KiCadComponentRef] = (
+        dict()
+    )
 
-    group_netlist.nets = set()
-    for net in netlist.nets:
+    group_nets: List[GroupNet | None] = list()
+    for net in nets:
         group_net = MutableGroupNet(set())
         for node in net:
             if node.ref not in groups_reverse_lookup:
@@ -247,21 +278,173 @@ def _gen_group_netlist(
             # This might very well be the only pin in the group net.
             group_net.add(global_group_pin_identifier)
         # We don't want to add empty nets.
-        if group_net:
-            group_netlist.nets.add(GroupNet(frozenset(group_net)))
+        group_nets.append(GroupNet(frozenset(group_net)) if group_net else None)
+    return group_nets
 
-    group_netlist.groups = groups_lookup
 
-    for group in group_netlist.groups.values():
+def _warn_about_groups_without_pins(groups: Iterable[Group]) -> None:
+    for group in groups:
         if len(group.pins) == 0:
             print(
                 f"Warning: The group {stringify_group_id(group.get_id())} has no pins.",
                 file=sys.stderr,
             )
 
+
+def _gen_group_netlist(
+    netlist: KiCadNetlist,
+    raw_groups_lookup: RawGroupLookup,
+    groups_reverse_lookup: GroupsReverseLookup,
+    lenient_names: bool,
+) -> GroupNetlist:
+    with span("pin names"):
+        explicit_pin_name_lookups = _get_explicit_pin_name_lookups(
+            raw_groups_lookup, lenient_names
+        )
+
+    group_netlist = GroupNetlist()
+    group_netlist.sources = {netlist.source}
+    group_netlist.date = datetime.now()
+    group_netlist.tool = TOOL_NAME_WITH_VERSION
+
+    # same as raw_groups_lookup but this time with the final Group class
+    group_netlist.groups = _create_groups(raw_groups_lookup)
+    with span("translate nets"):
+        group_nets = _translate_nets(
+            netlist.nets,
+            group_netlist.groups,
+            groups_reverse_lookup,
+            explicit_pin_name_lookups,
+            lenient_names,
+        )
+    group_netlist.nets = {
+        group_net for group_net in group_nets if group_net is not None
+    }
+
+    _warn_about_groups_without_pins(group_netlist.groups.values())
+
     return group_netlist
 
 
+def _get_dirty_groups(
+    component_fingerprints: Dict[KiCadComponentRef, ComponentFingerprint],
+    net_fingerprints: Dict[NetFingerprint, KiCadNet],
+    groups_reverse_lookup: GroupsReverseLookup,
+    cache: IncrementalCache,
+) -> Tuple[Set[KiCadComponentRef], Set[GroupIdentifier]]:
+    """
+    Find the components and groups that might look different from the last run.
+    These are all changed components, all components in changed nets and the groups they belong to before and after the change.
+    """
+    dirty_refs: Set[KiCadComponentRef] = set()
+    for ref, fingerprint in component_fingerprints.items():
+        if cache.component_fingerprints.get(ref) != fingerprint:
+            dirty_refs.add(ref)
+    # These components have been removed.
+    dirty_refs.update(
+        cache.component_fingerprints.keys() - component_fingerprints.keys()
+    )
+    # A net is either unchanged or it is added and its previous version is removed.
+    for net_fingerprint in net_fingerprints.keys() ^ cache.nets.keys():
+        for ref, _, _ in net_fingerprint:
+            dirty_refs.add(ref)
+
+    dirty_groups: Set[GroupIdentifier] = set()
+    for ref in dirty_refs:
+        if ref in groups_reverse_lookup:
+            dirty_groups.add(groups_reverse_lookup[ref])
+        if ref in cache.groups_reverse_lookup:
+            dirty_groups.add(cache.groups_reverse_lookup[ref])
+    return dirty_refs, dirty_groups
+
+
+# Like _gen_group_netlist but only recompute what might have changed since the run that created the cache.
+# Everything else is taken from the cache.
+# Return the Group Netlist and what Group Net each KiCad net has been translated into.
+def _patch_group_netlist(
+    netlist: KiCadNetlist,
+    raw_groups_lookup: RawGroupLookup,
+    groups_reverse_lookup: GroupsReverseLookup,
+    lenient_names: bool,
+    component_fingerprints: Dict[KiCadComponentRef, ComponentFingerprint],
+    net_fingerprints: Dict[NetFingerprint, KiCadNet],
+    cache: IncrementalCache,
+) -> Tuple[GroupNetlist, Dict[NetFingerprint, GroupNet | None]]:
+    dirty_refs, dirty_groups = _get_dirty_groups(
+        component_fingerprints, net_fingerprints, groups_reverse_lookup, cache
+    )
+    set_count("dirty groups", len(dirty_groups))
+
+    group_netlist = GroupNetlist()
+    group_netlist.sources = {netlist.source}
+    group_netlist.date = datetime.now()
+    group_netlist.tool = TOOL_NAME_WITH_VERSION
+
+    # The unchanged groups keep their pins.
+    group_netlist.groups = {
+        group_id: cache.groups[group_id]
+        for group_id in raw_groups_lookup.keys()
+        if group_id not in dirty_groups
+    }
+    dirty_raw_groups_lookup = RawGroupLookup({
+        group_id: raw_group
+        for group_id, raw_group in raw_groups_lookup.items()
+        if group_id in dirty_groups
+    })
+    new_groups = _create_groups(dirty_raw_groups_lookup)
+    group_netlist.groups.update(new_groups)
+
+    # An unchanged net only connects unchanged components of unchanged groups and can be taken from the cache.
+    # All other nets need to be translated again.
+    translated_nets: Dict[NetFingerprint, GroupNet | None] = dict()
+    dirty_net_fingerprints: List[NetFingerprint] = list()
+    for net_fingerprint, net in net_fingerprints.items():
+        if net_fingerprint in cache.nets and not any(
+            node.ref in dirty_refs
+            or (
+                node.ref in groups_reverse_lookup
+                and groups_reverse_lookup[node.ref] in dirty_groups
+            )
+            for node in net
+        ):
+            translated_nets[net_fingerprint] = cache.nets[net_fingerprint]
+        else:
+            dirty_net_fingerprints.append(net_fingerprint)
+
+    # The GroupPin names of all dirty groups need to be checked again.
+    # The dirty nets may connect unchanged groups, too. We need their pin names as well.
+    involved_raw_groups_lookup = RawGroupLookup(dict(dirty_raw_groups_lookup))
+    for net_fingerprint in dirty_net_fingerprints:
+        for node in net_fingerprints[net_fingerprint]:
+            if node.ref in groups_reverse_lookup:
+                group_id = groups_reverse_lookup[node.ref]
+                involved_raw_groups_lookup[group_id] = raw_groups_lookup[group_id]
+    with span("pin names"):
+        explicit_pin_name_lookups = _get_explicit_pin_name_lookups(
+            involved_raw_groups_lookup, lenient_names
+        )
+    with span("translate nets"):
+        group_nets = _translate_nets(
+            [
+                net_fingerprints[net_fingerprint]
+                for net_fingerprint in dirty_net_fingerprints
+            ],
+            group_netlist.groups,
+            groups_reverse_lookup,
+            explicit_pin_name_lookups,
+            lenient_names,
+        )
+    translated_nets.update(zip(dirty_net_fingerprints, group_nets))
+
+    group_netlist.nets = {
+        group_net for group_net in translated_nets.values() if group_net is not None
+    }
+
+    _warn_about_groups_without_pins(new_groups.values())
+
+    return group_netlist, translated_nets
+
+
 # There are a few stupid things one can do with a netlist.
 # This function ensures the electrical engineer didn't do such things and exits otherwise.
 def _check_kicad_netlist_structure(netlist: KiCadNetlist) -> None:
@@ -309,29 +492,229 @@ def _check_kicad_netlist_structure(netlist: KiCadNetlist) -> None:
             sys.exit(1)
 
 
+def _previous_output_matches(output_path: Path | None, cache: IncrementalCache) -> bool:
+    """
+    Check that the output is still what the run that created the cache wrote.
+    """
+    if output_path is None:
+        # There is no previous output to compare with.
+        return True
+    try:
+        with open(output_path, "rb") as output_file:
+            _, output_hash = split_content_hash(output_file.read())
+    except FileNotFoundError:
+        return False
+    return output_hash == cache.output_hash
+
+
 def create_group_netlist_from_kicad(
-    kicad_netlist_path: Path, lenient_names: bool, output_path: Path | None
+    kicad_netlist_path: Path,
+    lenient_names: bool,
+    output_path: Path | None,
+    incremental_cache_path: Path | None = None,
+    jobs: int = 1,
 ) -> None:
     """
     This function does the same and has the same parameters as the kicad_group_netlister CLI interface.
     """
-    kicad_netlist = parse_kicad_netlist(kicad_netlist_path, lenient_names)
-    _check_kicad_netlist_structure(kicad_netlist)
+    # Warn about replaced names again when a batch converts several KiCad Netlists in this process.
+    reset_name_warnings()
+    with span("parse"):
+        if kicad_netlist_path.suffix == ".kicad_sch":
+            kicad_netlist = parse_kicad_schematic(
+                kicad_netlist_path, lenient_names, jobs
+            )
+        else:
+            kicad_netlist = parse_kicad_netlist(kicad_netlist_path, lenient_names)
+    set_count("components", len(kicad_netlist.components))
+    set_count("kicad nets", len(kicad_netlist.nets))
+    with span("check"):
+        _check_kicad_netlist_structure(kicad_netlist)
+
+    with span("group"):
+        groups_lookup, groups_reverse_lookup = _group_components_by_group(
+            kicad_netlist, lenient_names
+        )
 
-    groups_lookup, groups_reverse_lookup = _group_components_by_group(
-        kicad_netlist, lenient_names
-    )
-    netlist = _gen_group_netlist(
-        kicad_netlist, groups_lookup, groups_reverse_lookup, lenient_names
+    if incremental_cache_path is None:
+        with span("generate"):
+            netlist = _gen_group_netlist(
+                kicad_netlist, groups_lookup, groups_reverse_lookup, lenient_names
+            )
+    else:
+        with span("fingerprint"):
+            component_fingerprints = {
+                ref: fingerprint_component(component)
+                for ref, component in kicad_netlist.components.items()
+            }
+            net_fingerprints = {fingerprint_net(net): net for net in kicad_netlist.nets}
+        with span("load cache"):
+            cache = load_incremental_cache(incremental_cache_path)
+            if (
+                cache is None
+                or cache.lenient_names != lenient_names
+                or cache.schematic != kicad_netlist.schematic
+                or not _previous_output_matches(output_path, cache)
+            ):
+                # Recompute everything.
+                cache = create_empty_incremental_cache()
+        with span("generate"):
+            netlist, translated_nets = _patch_group_netlist(
+                kicad_netlist,
+                groups_lookup,
+                groups_reverse_lookup,
+                lenient_names,
+                component_fingerprints,
+                net_fingerprints,
+                cache,
+            )
+    count_netlist(netlist.groups, netlist.nets)
+
+    with span("write"):
+        if output_path is not None:
+            print(f"Printing output to: {output_path}")
+            output_hash = write_group_netlist_file(netlist, output_path)
+        else:
+            output_hash = write_group_netlist(netlist, sys.stdout.buffer)
+
+    if incremental_cache_path is not None:
+        cache = IncrementalCache()
+        cache.lenient_names = lenient_names
+        cache.schematic = kicad_netlist.schematic
+        cache.output_hash = output_hash
+        cache.component_fingerprints = component_fingerprints
+        cache.groups_reverse_lookup = groups_reverse_lookup
+        cache.groups = netlist.groups
+        cache.nets = translated_nets
+        with span("store cache"):
+            store_incremental_cache(incremental_cache_path, cache)
+
+
+class NetlistJob(NamedTuple):
+    kicad_netlist_path: Path
+    output_path: Path
+    incremental_cache_path: Path | None
+
+
+def read_manifest(manifest_path: Path) -> List[NetlistJob]:
+    """
+    A manifest is a JSON list of objects with a `kicad_netlist` and an `output` path and optionally an `incremental_cache` path.
+    Relative paths are relative to the manifest's directory.
+    """
+    with open(manifest_path) as manifest_file:
+        try:
+            raw_jobs = json.load(manifest_file)
+        except json.JSONDecodeError as error:
+            print(
+                f"Error: The manifest {manifest_path} is no valid JSON: {error}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    if not isinstance(raw_jobs, list):
+        print(
+            f"Error: The manifest {manifest_path} must contain a list.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    jobs: List[NetlistJob] = []
+    output_paths: Set[Path] = set()
+    for raw_job in raw_jobs:
+        if (
+            not isinstance(raw_job, dict)
+            or not isinstance(raw_job.get("kicad_netlist"), str)
+            or not isinstance(raw_job.get("output"), str)
+            or not isinstance(raw_job.get("incremental_cache", ""), str)
+        ):
+            print(
+                f"Error: Every entry in the manifest {manifest_path} needs a kicad_netlist and an output path, not {raw_job}.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        job = NetlistJob(
+            manifest_path.parent / raw_job["kicad_netlist"],
+            manifest_path.parent / raw_job["output"],
+            None
+            if "incremental_cache" not in raw_job
+            else manifest_path.parent / raw_job["incremental_cache"],
+        )
+        if job.output_path in output_paths:
+            print(
+                f"Error: The manifest {manifest_path} writes to {job.output_path} twice.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        output_paths.add(job.output_path)
+        jobs.append(job)
+    return jobs
+
+
+def _run_job(job: NetlistJob, lenient_names: bool) -> float:
+    """
+    Convert a single KiCad Netlist of the batch and return how long that took in seconds.
+    """
+    start = time.perf_counter()
+    create_group_netlist_from_kicad(
+        job.kicad_netlist_path,
+        lenient_names,
+        job.output_path,
+        job.incremental_cache_path,
     )
+    return time.perf_counter() - start
 
-    output = stringify_group_netlist(netlist)
-    if output_path is not None:
-        print(f"Printing output to: {output_path}")
-        with open(output_path, "wb") as file:
-            file.write(output)
-    else:
-        sys.stdout.buffer.write(output)
+
+def create_group_netlists_from_kicad_batch(
+    manifest_path: Path, lenient_names: bool, jobs: int
+) -> None:
+    """
+    Convert every KiCad Netlist in the manifest.
+    With more than one job, the KiCad Netlists are converted in parallel on a process pool.
+    A failing KiCad Netlist is reported and the others are still converted.
+    """
+    netlist_jobs = read_manifest(manifest_path)
+
+    executor: ProcessPoolExecutor | None = None
+    futures: List[Future[float]] | None = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        futures = [
+            executor.submit(_run_job, job, lenient_names) for job in netlist_jobs
+        ]
+
+    failed = False
+    try:
+        for job_index, job in enumerate(netlist_jobs):
+            try:
+                if futures is None:
+                    # Keep the phases of the KiCad Netlists apart.
+                    with span(str(job.kicad_netlist_path)):
+                        seconds = _run_job(job, lenient_names)
+                else:
+                    # KiCad Netlists converted in other processes don't add to the phases and counts.
+                    seconds = futures[job_index].result()
+            except SystemExit:
+                # The error has already been printed.
+                print(
+                    f"Error: Converting {job.kicad_netlist_path} to {job.output_path} failed.",
+                    file=sys.stderr,
+                )
+                failed = True
+                continue
+            except Exception as error:
+                print(
+                    f"Error: Converting {job.kicad_netlist_path} to {job.output_path} failed: {error!r}",
+                    file=sys.stderr,
+                )
+                failed = True
+                continue
+            print(
+                f"Converted {job.kicad_netlist_path} to {job.output_path} in {seconds:.3f} s"
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if failed:
+        sys.exit(1)
 
 
 def main() -> None:
@@ -342,7 +725,11 @@ def main() -> None:
     )
     parser.add_argument(
         "kicad_netlist_file",
-        help="The path to a KiCad Netlist file (in the kicadxml format).",
+        help="The path to a KiCad Netlist file (in the kicadxml format). "
+        "Alternatively, the path to the root KiCad schematic (.kicad_sch), which is read directly without exporting a KiCad Netlist first. "
+        "Reading schematics doesn't support buses. "
+        "Leave this out when using --manifest.",
+        nargs="?",
     )
     parser.add_argument(
         "--lenient-names",
@@ -353,12 +740,75 @@ def main() -> None:
         "--output",
         help="The output path. Print to stdout if not provided.",
     )
-    args = parser.parse_args()
-    create_group_netlist_from_kicad(
-        Path(args.kicad_netlist_file),
-        args.lenient_names,
-        None if args.output is None else Path(args.output),
+    parser.add_argument(
+        "--incremental-cache",
+        help=INCREMENTAL_CACHE_HELP,
     )
+    parser.add_argument(
+        "--manifest",
+        help="Convert many KiCad Netlists in one go instead of a single one. "
+        "The manifest is a JSON list of objects with a 'kicad_netlist' and an 'output' path and optionally an 'incremental_cache' path, "
+        'e.g., [{"kicad_netlist": "board.xml", "output": "board_group_netlist.xml"}]. '
+        "Relative paths are relative to the manifest. "
+        "A failing KiCad Netlist doesn't stop the others.",
+    )
+    parser.add_argument(
+        "--jobs",
+        help="How many KiCad Netlists of the manifest to convert in parallel. "
+        "Without --manifest: How many KiCad schematic files to parse in parallel.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--profile",
+        help=PROFILE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats-json",
+        help=STATS_JSON_HELP,
+    )
+    parser.add_argument(
+        "--profile-memory",
+        help=PROFILE_MEMORY_HELP,
+        action="store_true",
+    )
+    args = parser.parse_args()
+    if args.profile or args.stats_json is not None or args.profile_memory:
+        enable_instrumentation(args.profile_memory)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+    try:
+        if args.manifest is not None:
+            if (
+                args.kicad_netlist_file is not None
+                or args.output is not None
+                or args.incremental_cache is not None
+            ):
+                parser.error(
+                    "--manifest can't be combined with kicad_netlist_file, --output or --incremental-cache."
+                )
+            create_group_netlists_from_kicad_batch(
+                Path(args.manifest), args.lenient_names, args.jobs
+            )
+        else:
+            if args.kicad_netlist_file is None:
+                parser.error("Either kicad_netlist_file or --manifest is required.")
+            create_group_netlist_from_kicad(
+                Path(args.kicad_netlist_file),
+                args.lenient_names,
+                None if args.output is None else Path(args.output),
+                None
+                if args.incremental_cache is None
+                else Path(args.incremental_cache),
+                args.jobs,
+            )
+    finally:
+        # Report what was measured even when a KiCad Netlist failed.
+        report_instrumentation(
+            args.profile or args.profile_memory,
+            None if args.stats_json is None else Path(args.stats_json),
+        )
 
 
 if __name__ == "__main__":
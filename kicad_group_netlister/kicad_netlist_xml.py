@@ -1,6 +1,7 @@
+import sys
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Set
+from typing import List, Set
 
 from common_types.group_types import assert_is_schematic
 from kicad_group_netlister.kicad_types import (
@@ -16,89 +17,128 @@ from kicad_group_netlister.kicad_types import (
 )
 
 
-def parse_kicad_netlist(netlist_path: Path, lenient_names: bool) -> KiCadNetlist:
-    netlist = KiCadNetlist()
+def _parse_sheet(sheet_tag: ET.Element) -> KiCadSheet:
+    path = sheet_tag.get("name")
+    assert path is not None
+    sheet = KiCadSheet()
+    sheet.path = KiCadSheetPath(path)
+    return sheet
+
+
+# All strings are interned because the same refs, pins and fields occur many times in large netlists.
+def _parse_component(comp_tag: ET.Element) -> KiCadComponent:
+    component = KiCadComponent()
+
+    component_ref = comp_tag.get("ref")
+    assert component_ref is not None
+    component.ref = KiCadComponentRef(sys.intern(component_ref))
+
+    sheetpath_tags = comp_tag.findall("./sheetpath")
+    assert len(sheetpath_tags) == 1
+    sheetpath = sheetpath_tags[0].get("names")
+    assert sheetpath is not None
+    component.sheetpath = KiCadSheetPath(sys.intern(sheetpath))
+
+    field_tags = comp_tag.findall("./fields/field")
+    component.fields = dict()
+    for field_tag in field_tags:
+        field_name = field_tag.get("name")
+        assert field_name is not None
+        field_value = field_tag.text
+
+        assert field_name not in component.fields
+        # Default to empty string.
+        component.fields[sys.intern(field_name)] = (
+            "" if field_value is None else sys.intern(field_value)
+        )
+
+    return component
+
 
-    tree = ET.parse(netlist_path)
-    root = tree.getroot()
+def _parse_net(net_tag: ET.Element) -> KiCadNet:
+    node_tags = net_tag.findall("./node")
+    nodes: Set[KiCadNode] = set()
+    for node_tag in node_tags:
+        node = KiCadNode()
 
-    source_tags = root.findall("./design/source")
-    assert len(source_tags) == 1
-    assert source_tags[0].text is not None
-    netlist.source = Path(source_tags[0].text)
+        ref = node_tag.get("ref")
+        assert ref is not None
+        node.ref = KiCadComponentRef(sys.intern(ref))
 
-    netlist.schematic = assert_is_schematic(
-        netlist.source.name.rstrip(".kicad_sch"), lenient=lenient_names
-    )
-    assert "." not in netlist.schematic
-    assert "/" not in netlist.schematic
+        pin = node_tag.get("pin")
+        assert pin is not None
+        node.pin = KiCadNodePinName(sys.intern(pin))
 
+        pinfunction = node_tag.get("pinfunction")
+        node.pinfunction = KiCadNodePinFunction(
+            "" if pinfunction is None else sys.intern(pinfunction)
+        )
+
+        # TODO: this assert doesn't actually do anything
+        assert node not in nodes
+        nodes.add(node)
+
+    return KiCadNet(frozenset(nodes))
+
+
+def parse_kicad_netlist(netlist_path: Path, lenient_names: bool) -> KiCadNetlist:
+    """
+    Parse a KiCad Netlist in the kicadxml format.
+    The file is read in a single streaming pass:
+    Every sheet, component and net is converted as soon as its element closes and then freed.
+    Therefore, the whole XML tree is never held in memory.
+    """
+    netlist = KiCadNetlist()
     netlist.sheets = set()
-    sheet_tags = root.findall("./design/sheet")
-    for sheet_tag in sheet_tags:
-        path = sheet_tag.get("name")
-        assert path is not None
-        sheet = KiCadSheet()
-        sheet.path = KiCadSheetPath(path)
-        netlist.sheets.add(sheet)
-
-    comp_tags = root.findall("./components/comp")
     netlist.components = dict()
-    for comp_tag in comp_tags:
-        component = KiCadComponent()
-
-        component_ref = comp_tag.get("ref")
-        assert component_ref is not None
-        component.ref = KiCadComponentRef(component_ref)
-
-        sheetpath_tags = comp_tag.findall("./sheetpath")
-        assert len(sheetpath_tags) == 1
-        sheetpath = sheetpath_tags[0].get("names")
-        assert sheetpath is not None
-        component.sheetpath = KiCadSheetPath(sheetpath)
-
-        field_tags = comp_tag.findall("./fields/field")
-        component.fields = dict()
-        for field_tag in field_tags:
-            field_name = field_tag.get("name")
-            assert field_name is not None
-            field_value = field_tag.text
-
-            assert field_name not in component.fields
-            # Default to empty string.
-            component.fields[field_name] = "" if field_value is None else field_value
-
-        assert component.ref not in netlist.components
-        netlist.components[component.ref] = component
-
-    net_tags = root.findall("./nets/net")
     netlist.nets = set()
-    for net_tag in net_tags:
-        node_tags = net_tag.findall("./node")
-        nodes: Set[KiCadNode] = set()
-        for node_tag in node_tags:
-            node = KiCadNode()
-
-            ref = node_tag.get("ref")
-            assert ref is not None
-            node.ref = KiCadComponentRef(ref)
-
-            pin = node_tag.get("pin")
-            assert pin is not None
-            node.pin = KiCadNodePinName(pin)
-
-            pinfunction = node_tag.get("pinfunction")
-            node.pinfunction = KiCadNodePinFunction(
-                "" if pinfunction is None else pinfunction
-            )
-
-            # TODO: this assert doesn't actually do anything
-            assert node not in nodes
-            nodes.add(node)
-
-        net = KiCadNet(frozenset(nodes))
-        # TODO: this assert doesn't actually do anything
-        assert net not in netlist.nets
-        netlist.nets.add(net)
-
+    found_source = False
+
+    # All currently open elements, starting with the root element.
+    open_tags: List[ET.Element] = []
+    for event, tag in ET.iterparse(netlist_path, events=("start", "end")):
+        if event == "start":
+            open_tags.append(tag)
+            continue
+        open_tags.pop()
+        # We only care about elements in the top level sections, e.g., <export><nets><net>.
+        # Everything deeper is handled by its ancestor in that depth.
+        if len(open_tags) != 2:
+            continue
+        section = open_tags[1]
+
+        match (section.tag, tag.tag):
+            case ("design", "source"):
+                assert not found_source
+                found_source = True
+                assert tag.text is not None
+                netlist.source = Path(tag.text)
+
+                netlist.schematic = assert_is_schematic(
+                    netlist.source.name.removesuffix(".kicad_sch"),
+                    lenient=lenient_names,
+                )
+                assert "." not in netlist.schematic
+                assert "/" not in netlist.schematic
+
+            case ("design", "sheet"):
+                netlist.sheets.add(_parse_sheet(tag))
+
+            case ("components", "comp"):
+                component = _parse_component(tag)
+                assert component.ref not in netlist.components
+                netlist.components[component.ref] = component
+
+            case ("nets", "net"):
+                net = _parse_net(tag)
+                # TODO: this assert doesn't actually do anything
+                assert net not in netlist.nets
+                netlist.nets.add(net)
+
+        # We're done with this element; free it and its children.
+        # All previous siblings have already been removed so this is cheap.
+        tag.clear()
+        section.remove(tag)
+
+    assert found_source
     return netlist
@@ -0,0 +1,735 @@
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from common_types.group_types import assert_is_schematic
+from kicad_group_netlister.kicad_types import (
+    KiCadComponent,
+    KiCadComponentRef,
+    KiCadNet,
+    KiCadNetlist,
+    KiCadNode,
+    KiCadNodePinFunction,
+    KiCadNodePinName,
+    KiCadSheet,
+    KiCadSheetPath,
+)
+
+"""
+An S-expression is a list whose first element is its name, e.g., ["at", "127", "85.09", "0"].
+All atoms are strings, quoted or not.
+"""
+SExpression = List["str | SExpression"]
+
+"""
+Schematic coordinates in KiCad's internal unit of 100 nm.
+Using integers makes points that KiCad considers equal compare equal.
+"""
+Point = Tuple[int, int]
+
+"""
+A KiCad transform matrix (x1, y1, x2, y2): x' = x1 * x + y1 * y and y' = x2 * x + y2 * y.
+"""
+Transform = Tuple[int, int, int, int]
+
+_TOKEN_PATTERN = re.compile(r'\(|\)|"((?:[^"\\]|\\.)*)"|[^\s()"]+')
+_ESCAPE_PATTERN = re.compile(r"\\(.)")
+_ESCAPES = {"n": "\n", "t": "\t"}
+_IGNORED_FIELDS = {"Reference", "Value"}
+
+
+class _LabelKind(Enum):
+    LOCAL = "local"
+    GLOBAL = "global"
+    HIERARCHICAL = "hierarchical"
+
+
+class _SchematicPin(NamedTuple):
+    number: str
+    name: str
+    """
+    The index of the sheet-local net the pin is on.
+    """
+    subnet: int
+
+
+class _SchematicSymbol(NamedTuple):
+    """
+    A placed unit of a symbol.
+    """
+
+    """
+    Map the path of sheet UUIDs of each instance of the sheet to the symbol's reference in that instance.
+    """
+    references: Dict[str, str]
+    default_reference: str
+    fields: Dict[str, str]
+    pins: List[_SchematicPin]
+
+
+class _SchematicSheet(NamedTuple):
+    """
+    A sheet symbol, i.e., an instance of a sub-sheet.
+    """
+
+    uuid: str
+    name: str
+    file: str
+    """
+    Map the name of each sheet pin to the sheet-local net it is on.
+    """
+    pins: Dict[str, int]
+
+
+class _SchematicFile(NamedTuple):
+    """
+    One .kicad_sch file with its connectivity resolved as far as possible without knowing the hierarchy.
+    Files used by several sheets are only parsed once.
+    """
+
+    uuid: str
+    symbols: List[_SchematicSymbol]
+    sheets: List[_SchematicSheet]
+    labels: List[Tuple[_LabelKind, str, int]]
+    """
+    The sheet-local nets are numbered from 0 to subnet_count - 1.
+    """
+    subnet_count: int
+    has_buses: bool
+
+
+class _LibraryPin(NamedTuple):
+    unit: int
+    body_style: int
+    position: Point
+    number: str
+    name: str
+    hidden_power_input: bool
+
+
+class _LibrarySymbol(NamedTuple):
+    pins: List[_LibraryPin]
+    """
+    None for symbols that aren't power symbols.
+    """
+    power: _LabelKind | None
+
+
+def _parse_s_expression(text: str) -> SExpression:
+    # Tokens are matched by position because a quoted "(" is a string, not a parenthesis.
+    stack: List[SExpression] = [[]]
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group(0)
+        if token == "(":
+            expression: SExpression = []
+            stack[-1].append(expression)
+            stack.append(expression)
+        elif token == ")":
+            stack.pop()
+            assert len(stack) > 0
+        elif match.group(1) is not None:
+            quoted = match.group(1)
+            stack[-1].append(
+                quoted
+                if "\\" not in quoted
+                else _ESCAPE_PATTERN.sub(
+                    lambda escape: _ESCAPES.get(escape[1], escape[1]), quoted
+                )
+            )
+        else:
+            stack[-1].append(token)
+    assert len(stack) == 1
+    assert len(stack[0]) == 1
+    root = stack[0][0]
+    assert isinstance(root, list)
+    return root
+
+
+def _children(expression: SExpression, name: str) -> Iterator[SExpression]:
+    for child in expression[1:]:
+        if isinstance(child, list) and len(child) > 0 and child[0] == name:
+            yield child
+
+
+def _child(expression: SExpression, name: str) -> SExpression | None:
+    return next(_children(expression, name), None)
+
+
+def _atom(expression: SExpression | None, index: int = 1, default: str = "") -> str:
+    if expression is None or len(expression) <= index:
+        return default
+    atom = expression[index]
+    assert isinstance(atom, str)
+    return atom
+
+
+def _to_internal_unit(millimeters: str) -> int:
+    return round(float(millimeters) * 10000)
+
+
+def _parse_point(expression: SExpression) -> Point:
+    return (
+        _to_internal_unit(_atom(expression, 1)),
+        _to_internal_unit(_atom(expression, 2)),
+    )
+
+
+def _is_hidden(expression: SExpression) -> bool:
+    # KiCad 6 and 7 write a bare `hide`, newer versions `(hide yes)`.
+    return "hide" in expression[1:] or _atom(_child(expression, "hide")) == "yes"
+
+
+def _get_properties(expression: SExpression) -> Dict[str, str]:
+    return {
+        _atom(prop, 1): _atom(prop, 2) for prop in _children(expression, "property")
+    }
+
+
+def _parse_library_symbols(lib_symbols: SExpression) -> Dict[str, _LibrarySymbol]:
+    library: Dict[str, _LibrarySymbol] = dict()
+    parents: Dict[str, str] = dict()
+    for symbol in _children(lib_symbols, "symbol"):
+        lib_id = _atom(symbol)
+        pins: List[_LibraryPin] = []
+        # Units are stored as nested symbols named like `R_1_1`: the unit and the body style.
+        # Unit 0 and body style 0 are shared by all units and body styles.
+        for unit_symbol in _children(symbol, "symbol"):
+            _, unit, body_style = _atom(unit_symbol).rsplit("_", 2)
+            for pin in _children(unit_symbol, "pin"):
+                at = _child(pin, "at")
+                assert at is not None
+                pins.append(
+                    _LibraryPin(
+                        int(unit),
+                        int(body_style),
+                        _parse_point(at),
+                        _atom(_child(pin, "number")),
+                        _atom(_child(pin, "name")),
+                        _atom(pin) == "power_in" and _is_hidden(pin),
+                    )
+                )
+        power = _child(symbol, "power")
+        library[lib_id] = _LibrarySymbol(
+            pins,
+            None
+            if power is None
+            else _LabelKind.LOCAL
+            if _atom(power) == "local"
+            else _LabelKind.GLOBAL,
+        )
+        extends = _child(symbol, "extends")
+        if extends is not None:
+            parents[lib_id] = lib_id.split(":", 1)[0] + ":" + _atom(extends)
+
+    # Derived symbols have the pins of their parent.
+    for lib_id, parent_id in parents.items():
+        if len(library[lib_id].pins) == 0 and parent_id in library:
+            library[lib_id] = library[lib_id]._replace(pins=library[parent_id].pins)
+    return library
+
+
+def _get_symbol_transform(rotation: int, mirror: str) -> Transform:
+    """
+    Combine the rotation and mirroring of a placed symbol the way KiCad does.
+    The default transform flips the y-axis because libraries point it up and schematics down.
+    """
+    x1, y1, x2, y2 = 1, 0, 0, -1
+    steps: List[Transform] = [(0, 1, -1, 0)] * (rotation // 90 % 4)
+    if mirror == "x":
+        steps.append((1, 0, 0, -1))
+    elif mirror == "y":
+        steps.append((-1, 0, 0, 1))
+    for step_x1, step_y1, step_x2, step_y2 in steps:
+        x1, y1, x2, y2 = (
+            x1 * step_x1 + x2 * step_y1,
+            y1 * step_x1 + y2 * step_y1,
+            x1 * step_x2 + x2 * step_y2,
+            y1 * step_x2 + y2 * step_y2,
+        )
+    return x1, y1, x2, y2
+
+
+class _UnionFind:
+    """
+    Connect elements numbered from 0.
+    """
+
+    parents: List[int]
+
+    def __init__(self) -> None:
+        self.parents = []
+
+    def add(self) -> int:
+        self.parents.append(len(self.parents))
+        return len(self.parents) - 1
+
+    def find(self, index: int) -> int:
+        root = index
+        while self.parents[root] != root:
+            root = self.parents[root]
+        # Compress the path.
+        while self.parents[index] != root:
+            self.parents[index], index = root, self.parents[index]
+        return root
+
+    def union(self, first: int, second: int) -> None:
+        self.parents[self.find(first)] = self.find(second)
+
+
+class _PointIndex:
+    """
+    Number the connection points of one sheet and connect them.
+    """
+
+    connections: _UnionFind
+    indices: Dict[Point, int]
+
+    def __init__(self) -> None:
+        self.connections = _UnionFind()
+        self.indices = dict()
+
+    def add(self, point: Point) -> int:
+        index = self.indices.get(point)
+        if index is None:
+            index = self.connections.add()
+            self.indices[point] = index
+        return index
+
+
+def _connect_points_on_wires(
+    points: _PointIndex,
+    wires: List[Tuple[Point, Point]],
+) -> None:
+    """
+    A point in the middle of a wire connects to it, e.g., a junction, a label, a pin or the end of another wire.
+    KiCad usually splits such wires itself but doesn't have to.
+    """
+    horizontal: Dict[int, List[Tuple[int, int, Point]]] = dict()
+    vertical: Dict[int, List[Tuple[int, int, Point]]] = dict()
+    diagonal: List[Tuple[Point, Point]] = []
+    for start, end in wires:
+        if start[1] == end[1]:
+            horizontal.setdefault(start[1], []).append((
+                min(start[0], end[0]),
+                max(start[0], end[0]),
+                start,
+            ))
+        elif start[0] == end[0]:
+            vertical.setdefault(start[0], []).append((
+                min(start[1], end[1]),
+                max(start[1], end[1]),
+                start,
+            ))
+        else:
+            diagonal.append((start, end))
+
+    for point, point_index in points.indices.items():
+        for low, high, start in horizontal.get(point[1], []):
+            if low < point[0] < high:
+                points.connections.union(point_index, points.indices[start])
+        for low, high, start in vertical.get(point[0], []):
+            if low < point[1] < high:
+                points.connections.union(point_index, points.indices[start])
+        for start, end in diagonal:
+            cross = (end[0] - start[0]) * (point[1] - start[1]) - (
+                end[1] - start[1]
+            ) * (point[0] - start[0])
+            if cross == 0 and min(start[0], end[0]) < point[0] < max(start[0], end[0]):
+                points.connections.union(point_index, points.indices[start])
+
+
+def _parse_schematic_file(schematic_path: Path) -> _SchematicFile:
+    """
+    Parse one .kicad_sch file and connect everything that touches on this sheet.
+    Labels and sheet pins are resolved later because they depend on the hierarchy.
+    """
+    try:
+        with open(schematic_path, encoding="utf-8") as schematic_file:
+            root = _parse_s_expression(schematic_file.read())
+    except FileNotFoundError:
+        print(
+            f"Error: The KiCad schematic {schematic_path} doesn't exist.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if root[0] != "kicad_sch":
+        print(
+            f"Error: {schematic_path} is no KiCad schematic.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    lib_symbols = _child(root, "lib_symbols")
+    library = dict() if lib_symbols is None else _parse_library_symbols(lib_symbols)
+    points = _PointIndex()
+
+    wires: List[Tuple[Point, Point]] = []
+    for wire in _children(root, "wire"):
+        pts = _child(wire, "pts")
+        assert pts is not None
+        xys = list(_children(pts, "xy"))
+        for start, end in zip(xys, xys[1:]):
+            wires.append((_parse_point(start), _parse_point(end)))
+    for start, end in wires:
+        points.connections.union(points.add(start), points.add(end))
+    for junction in _children(root, "junction"):
+        at = _child(junction, "at")
+        assert at is not None
+        points.add(_parse_point(at))
+
+    # Everything else is attached to a point and resolved to a subnet once all points are connected.
+    labels: List[Tuple[_LabelKind, str, int]] = []
+    for label_kind, expression_name in [
+        (_LabelKind.LOCAL, "label"),
+        (_LabelKind.GLOBAL, "global_label"),
+        (_LabelKind.HIERARCHICAL, "hierarchical_label"),
+    ]:
+        for label in _children(root, expression_name):
+            at = _child(label, "at")
+            assert at is not None
+            labels.append((label_kind, _atom(label), points.add(_parse_point(at))))
+
+    symbols: List[_SchematicSymbol] = []
+    for symbol in _children(root, "symbol"):
+        lib_name = _child(symbol, "lib_name")
+        lib_id = _atom(lib_name if lib_name is not None else _child(symbol, "lib_id"))
+        if lib_id not in library:
+            print(
+                f"Error: The KiCad schematic {schematic_path} uses the symbol {lib_id} but doesn't contain it in its lib_symbols.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        library_symbol = library[lib_id]
+        at = _child(symbol, "at")
+        assert at is not None
+        x, y = _parse_point(at)
+        x1, y1, x2, y2 = _get_symbol_transform(
+            round(float(_atom(at, 3, "0"))), _atom(_child(symbol, "mirror"))
+        )
+        unit = int(_atom(_child(symbol, "unit"), 1, "1"))
+        # KiCad 9 renamed convert to body_style.
+        body_style = int(
+            _atom(_child(symbol, "body_style") or _child(symbol, "convert"), 1, "1")
+        )
+        properties = _get_properties(symbol)
+
+        pins: List[_SchematicPin] = []
+        for pin in library_symbol.pins:
+            if pin.unit not in (0, unit) or pin.body_style not in (0, body_style):
+                continue
+            pin_x, pin_y = pin.position
+            point_index = points.add((
+                x + x1 * pin_x + y1 * pin_y,
+                y + x2 * pin_x + y2 * pin_y,
+            ))
+            pins.append(_SchematicPin(pin.number, pin.name, point_index))
+            if library_symbol.power is not None:
+                # Power symbols connect their pin to the net named like their value.
+                labels.append((
+                    library_symbol.power,
+                    properties.get("Value", pin.name),
+                    point_index,
+                ))
+            elif pin.hidden_power_input:
+                # Hidden power input pins implicitly connect to the global net named like them.
+                labels.append((_LabelKind.GLOBAL, pin.name, point_index))
+
+        references: Dict[str, str] = dict()
+        for instances in _children(symbol, "instances"):
+            for project in _children(instances, "project"):
+                for path in _children(project, "path"):
+                    references[_atom(path)] = _atom(_child(path, "reference"))
+        symbols.append(
+            _SchematicSymbol(
+                references,
+                properties.get("Reference", ""),
+                {
+                    # KiCad shows ~ as an empty text.
+                    name: "" if value == "~" else value
+                    for name, value in properties.items()
+                    if name not in _IGNORED_FIELDS
+                },
+                pins,
+            )
+        )
+
+    sheets: List[_SchematicSheet] = []
+    sheet_pin_points: List[Dict[str, int]] = []
+    for sheet in _children(root, "sheet"):
+        properties = _get_properties(sheet)
+        sheet_pins: Dict[str, int] = dict()
+        for pin in _children(sheet, "pin"):
+            at = _child(pin, "at")
+            assert at is not None
+            sheet_pins[_atom(pin)] = points.add(_parse_point(at))
+        sheet_pin_points.append(sheet_pins)
+        sheets.append(
+            _SchematicSheet(
+                _atom(_child(sheet, "uuid")),
+                # KiCad 6 used names with spaces.
+                properties.get("Sheetname", properties.get("Sheet name", "")),
+                properties.get("Sheetfile", properties.get("Sheet file", "")),
+                dict(),
+            )
+        )
+
+    _connect_points_on_wires(points, wires)
+
+    # Number the connected groups of points.
+    subnets: Dict[int, int] = dict()
+    for index in range(len(points.connections.parents)):
+        subnets.setdefault(points.connections.find(index), len(subnets))
+
+    def get_subnet(point_index: int) -> int:
+        return subnets[points.connections.find(point_index)]
+
+    return _SchematicFile(
+        _atom(_child(root, "uuid")),
+        [
+            symbol._replace(
+                pins=[
+                    pin._replace(subnet=get_subnet(pin.subnet)) for pin in symbol.pins
+                ]
+            )
+            for symbol in symbols
+        ],
+        [
+            sheet._replace(
+                pins={
+                    name: get_subnet(point_index)
+                    for name, point_index in sheet_pins.items()
+                }
+            )
+            for sheet, sheet_pins in zip(sheets, sheet_pin_points)
+        ],
+        [(kind, name, get_subnet(point_index)) for kind, name, point_index in labels],
+        len(subnets),
+        _child(root, "bus") is not None or _child(root, "bus_entry") is not None,
+    )
+
+
+def _parse_schematic_files(root_path: Path, jobs: int) -> Dict[Path, _SchematicFile]:
+    """
+    Parse the root schematic and all sub-sheets it references, each file once.
+    The sub-sheets of each level of the hierarchy are parsed in parallel on a process pool with more than one job.
+    """
+    schematic_files: Dict[Path, _SchematicFile] = dict()
+    executor = None if jobs <= 1 else ProcessPoolExecutor(max_workers=jobs)
+    try:
+        level = [root_path]
+        while len(level) > 0:
+            if executor is None or len(level) == 1:
+                parsed_files = [_parse_schematic_file(path) for path in level]
+            else:
+                parsed_files = list(executor.map(_parse_schematic_file, level))
+            next_level: List[Path] = []
+            for path, schematic_file in zip(level, parsed_files):
+                schematic_files[path] = schematic_file
+                for sheet in schematic_file.sheets:
+                    # KiCad resolves sheet files relative to the file containing the sheet.
+                    sheet_path = (path.parent / sheet.file).resolve()
+                    if (
+                        sheet_path not in schematic_files
+                        and sheet_path not in next_level
+                    ):
+                        next_level.append(sheet_path)
+            level = next_level
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return schematic_files
+
+
+class _SheetInstance(NamedTuple):
+    path: Path
+    schematic_file: _SchematicFile
+    """
+    The path of sheet UUIDs KiCad uses to tell the instances of the same sheet apart.
+    """
+    uuid_path: str
+    """
+    The path of sheet names, e.g., `/POWER_LED/`.
+    """
+    sheet_path: KiCadSheetPath
+    """
+    The global index of this sheet's subnet 0.
+    """
+    offset: int
+    parent: int | None
+    """
+    The sheet pins of the sheet symbol in the parent sheet.
+    """
+    sheet_pins: Dict[str, int]
+
+
+def _instantiate_sheets(
+    root_path: Path, schematic_files: Dict[Path, _SchematicFile]
+) -> List[_SheetInstance]:
+    root_file = schematic_files[root_path]
+    instances = [
+        _SheetInstance(
+            root_path,
+            root_file,
+            "/" + root_file.uuid,
+            KiCadSheetPath("/"),
+            0,
+            None,
+            dict(),
+        )
+    ]
+    offset = root_file.subnet_count
+    # The instances list doubles as the queue of sheets whose sub-sheets still have to be instantiated.
+    instance_index = 0
+    while instance_index < len(instances):
+        instance = instances[instance_index]
+        for sheet in instance.schematic_file.sheets:
+            sheet_path = (instance.path.parent / sheet.file).resolve()
+            if sheet_path in {
+                ancestor.path for ancestor in _get_ancestors(instances, instance_index)
+            }:
+                print(
+                    f"Error: The KiCad schematic {sheet_path} contains itself.",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+            schematic_file = schematic_files[sheet_path]
+            instances.append(
+                _SheetInstance(
+                    sheet_path,
+                    schematic_file,
+                    instance.uuid_path + "/" + sheet.uuid,
+                    KiCadSheetPath(instance.sheet_path + sheet.name + "/"),
+                    offset,
+                    instance_index,
+                    {
+                        name: instance.offset + subnet
+                        for name, subnet in sheet.pins.items()
+                    },
+                )
+            )
+            offset += schematic_file.subnet_count
+        instance_index += 1
+    return instances
+
+
+def _get_ancestors(
+    instances: List[_SheetInstance], instance_index: int | None
+) -> Iterator[_SheetInstance]:
+    while instance_index is not None:
+        yield instances[instance_index]
+        instance_index = instances[instance_index].parent
+
+
+def _connect_sheets(instances: List[_SheetInstance]) -> _UnionFind:
+    """
+    Connect the subnets of all sheet instances through labels, power symbols and sheet pins.
+    The union-find's indices are the global subnet indices.
+    """
+    subnets = _UnionFind()
+    for instance in instances:
+        for _ in range(instance.schematic_file.subnet_count):
+            subnets.add()
+
+    named_subnets: Dict[Tuple[int | None, str], int] = dict()
+    for instance_index, instance in enumerate(instances):
+        for kind, name, subnet in instance.schematic_file.labels:
+            global_subnet = instance.offset + subnet
+            match kind:
+                case _LabelKind.GLOBAL:
+                    key = (None, name)
+                case _LabelKind.LOCAL:
+                    key = (instance_index, name)
+                case _LabelKind.HIERARCHICAL:
+                    # Like KiCad, connect it to the local labels of the same name on this sheet, too.
+                    key = (instance_index, name)
+                    sheet_pin = instance.sheet_pins.get(name)
+                    if sheet_pin is not None:
+                        subnets.union(sheet_pin, global_subnet)
+            if key in named_subnets:
+                subnets.union(named_subnets[key], global_subnet)
+            else:
+                named_subnets[key] = global_subnet
+    return subnets
+
+
+def parse_kicad_schematic(
+    schematic_path: Path, lenient_names: bool, jobs: int = 1
+) -> KiCadNetlist:
+    """
+    Read a KiCad schematic and its sub-sheets directly instead of a KiCad Netlist exported from them.
+    The result is the same as parsing the KiCad Netlist KiCad exports for that schematic.
+    Buses, text variables and net ties aren't supported.
+    """
+    root_path = schematic_path.resolve()
+    schematic_files = _parse_schematic_files(root_path, jobs)
+    for path, schematic_file in schematic_files.items():
+        if schematic_file.has_buses:
+            print(
+                f"Warning: The KiCad schematic {path} contains buses. "
+                "Connections through buses are ignored; export a KiCad Netlist instead.",
+                file=sys.stderr,
+            )
+    instances = _instantiate_sheets(root_path, schematic_files)
+    subnets = _connect_sheets(instances)
+
+    netlist = KiCadNetlist()
+    # KiCad Netlists contain the absolute path, too.
+    netlist.source = root_path
+    netlist.schematic = assert_is_schematic(
+        netlist.source.name.removesuffix(".kicad_sch"), lenient=lenient_names
+    )
+    assert "." not in netlist.schematic
+    assert "/" not in netlist.schematic
+    netlist.sheets = set()
+    netlist.components = dict()
+
+    nodes: Dict[Tuple[str, str], Tuple[KiCadNode, int]] = dict()
+    for instance in instances:
+        sheet = KiCadSheet()
+        sheet.path = instance.sheet_path
+        netlist.sheets.add(sheet)
+
+        # Symbols of sheets written by KiCad 6 don't contain the root sheet's UUID.
+        short_uuid_path = instance.uuid_path[instance.uuid_path.find("/", 1) :] or "/"
+        for symbol in instance.schematic_file.symbols:
+            reference = symbol.references.get(
+                instance.uuid_path,
+                symbol.references.get(short_uuid_path, symbol.default_reference),
+            )
+            # Power symbols and other virtual symbols aren't part of KiCad Netlists.
+            if reference.startswith("#"):
+                continue
+            ref = KiCadComponentRef(sys.intern(reference))
+            if ref not in netlist.components:
+                # The first unit of a multi-unit symbol defines the fields.
+                component = KiCadComponent()
+                component.ref = ref
+                component.sheetpath = KiCadSheetPath(sys.intern(instance.sheet_path))
+                component.fields = {
+                    sys.intern(name): sys.intern(value)
+                    for name, value in symbol.fields.items()
+                }
+                netlist.components[ref] = component
+            for pin in symbol.pins:
+                global_subnet = instance.offset + pin.subnet
+                if (ref, pin.number) in nodes:
+                    # Pins with the same number are the same pin.
+                    subnets.union(nodes[(ref, pin.number)][1], global_subnet)
+                    continue
+                node = KiCadNode()
+                node.ref = ref
+                node.pin = KiCadNodePinName(sys.intern(pin.number))
+                node.pinfunction = KiCadNodePinFunction(
+                    "" if pin.name == "~" else sys.intern(pin.name)
+                )
+                nodes[(ref, pin.number)] = (node, global_subnet)
+
+    # Like KiCad, put unconnected pins into nets of their own.
+    nets: Dict[int, List[KiCadNode]] = dict()
+    for node, global_subnet in nodes.values():
+        nets.setdefault(subnets.find(global_subnet), []).append(node)
+    netlist.nets = {KiCadNet(frozenset(net)) for net in nets.values()}
+    return netlist
@@ -29,6 +29,8 @@ class KiCadSheet:
 
 
 class KiCadComponent:
+    __slots__ = ("ref", "sheetpath", "fields")
+
     ref: KiCadComponentRef
     sheetpath: KiCadSheetPath
     fields: Dict[str, str]
@@ -42,6 +44,8 @@ class KiCadNode:
     a pin on a component that is connected to some net(s)
     """
 
+    __slots__ = ("ref", "pin", "pinfunction")
+
     ref: KiCadComponentRef
     pin: KiCadNodePinName
     pinfunction: KiCadNodePinFunction
@@ -1,27 +1,43 @@
 import argparse
 import csv
+import io
 from pathlib import Path
 import sys
-from typing import Set, TextIO, Tuple
+from typing import AbstractSet, Dict, Iterable, Iterator, List, Set, TextIO, Tuple
 import re
 
 from common_types.group_types import (
     GlobalGroupPinIdentifier,
     GroupGlob,
     GroupIdentifier,
-    GroupNetlistWithConnections,
+    GroupNet,
+    GroupNetlist,
     GroupPinName,
-    GroupWithConnection,
     assert_is_group_path,
     assert_is_group_type,
     assert_is_pin_name,
     assert_is_schematic,
     compile_group_glob,
-    connect_netlist,
-    does_match_pattern,
     stringify_group_id,
 )
-from common_types.parse_xml import parse_group_netlist
+from common_types.instrumentation import (
+    PROFILE_HELP,
+    PROFILE_MEMORY_HELP,
+    STATS_JSON_HELP,
+    count_netlist,
+    enable_instrumentation,
+    report_instrumentation,
+    set_count,
+    span,
+)
+from common_types.output_file import open_output_if_changed
+from common_types.parse_xml import (
+    PARSE_CACHE_DIR_HELP,
+    PARSE_CACHE_HELP,
+    VERIFY_POLICY_HELP,
+    VerifyPolicy,
+    parse_group_netlist,
+)
 
 TOOL_NAME = "group_many_to_many_map_to_csv v0.1.0"
 TOOL_NAME_WITH_VERSION = f"{TOOL_NAME} v0.1.0"
@@ -35,71 +51,164 @@ def _get_sort_key(name: str) -> Tuple[int, str]:
     return num, name
 
 
-def _simplify_nets(
-    netlist: GroupNetlistWithConnections,
-    simplify_pins: Set[GroupPinName],
-) -> GroupNetlistWithConnections:
-    # Simplify some nets.
-    for group in netlist.groups.values():
-        for pin in group.pins.values():
-            # Check if this net can be simplified.
-
-            # Not None iff we found a simplification.
-            found_simplify_pin: GroupPinName | None = None
-            for _, other_pin in pin:
-                for simplify_pin in simplify_pins:
-                    if simplify_pin in other_pin:
-                        found_simplify_pin = simplify_pin
-                        print(
-                            f"Warning: Simplifying {other_pin} to {found_simplify_pin}",
-                            file=sys.stderr,
-                        )
-                        break
-                if found_simplify_pin is not None:
-                    break
-            if found_simplify_pin is not None:
-                pin.clear()
-                pin.add(
-                    GlobalGroupPinIdentifier(
-                        GroupIdentifier(
-                            # TODO: do this better
-                            assert_is_schematic("This_was"),
-                            assert_is_group_path("/Simplified/"),
-                            assert_is_group_type("Away"),
-                        ),
-                        found_simplify_pin,
-                    )
-                )
+def _get_root_pin_nets(
+    netlist: GroupNetlist, root_group_ids: Set[GroupIdentifier]
+) -> Dict[GlobalGroupPinIdentifier, GroupNet]:
+    """
+    Map every pin of a root group to the net it belongs to.
+    Pins that aren't connected to anything don't appear in this dict.
+    Nets that don't touch any root group are skipped.
+    """
+    root_pin_nets: Dict[GlobalGroupPinIdentifier, GroupNet] = dict()
+    for net in netlist.nets:
+        for global_pin in net:
+            if global_pin.group_id in root_group_ids:
+                root_pin_nets[global_pin] = net
+    return root_pin_nets
+
+
+"""
+All pins of a simplified net are replaced with a single pin on this group.
+"""
+SIMPLIFIED_GROUP_ID = GroupIdentifier(
+    # TODO: do this better
+    assert_is_schematic("This_was"),
+    assert_is_group_path("/Simplified/"),
+    assert_is_group_type("Away"),
+)
+
+
+class _NetSimplifier:
+    """
+    Decide once per net whether it is simplified and to what.
+    """
 
-    return netlist
+    """
+    Matches any simplify pin. None when there are no simplify pins.
+    """
+    _pattern: re.Pattern[str] | None
+    """
+    Map each net to its first two pins that contain a simplify pin and the simplify pin they contain.
+    Two are enough because a pin's net is never simplified because of the pin itself.
+    """
+    _matches: Dict[GroupNet, List[Tuple[GlobalGroupPinIdentifier, GroupPinName]]]
 
+    def __init__(self, simplify_pins: Set[GroupPinName]) -> None:
+        self._pattern = (
+            None
+            if len(simplify_pins) == 0
+            else re.compile("|".join(map(re.escape, sorted(simplify_pins))))
+        )
+        self._matches = dict()
 
+    def get_simplify_pin(
+        self, net: GroupNet, global_pin: GlobalGroupPinIdentifier
+    ) -> GroupPinName | None:
+        """
+        Return what the net is simplified to from the perspective of `global_pin`.
+        The net is simplified when any other pin has a simplify pin as a substring.
+        Return None if the net isn't simplified.
+        """
+        if self._pattern is None:
+            return None
+        if net not in self._matches:
+            matches: List[Tuple[GlobalGroupPinIdentifier, GroupPinName]] = []
+            for other_pin in net:
+                match = self._pattern.search(other_pin.pin)
+                if match is not None:
+                    matches.append((other_pin, GroupPinName(match.group(0))))
+                    if len(matches) == 2:
+                        break
+            self._matches[net] = matches
+        for matched_pin, simplify_pin in self._matches[net]:
+            if matched_pin != global_pin:
+                return simplify_pin
+        return None
+
+
+# Only the root groups are exported.
 # This is for example used for connectors.
 # There we only care about connectors and don't care about connections between connectors,
 # only from connector to other groups (i.e., non-root groups).
-def _focus_on_root(
-    netlist: GroupNetlistWithConnections,
+def _generate_rows(
+    netlist: GroupNetlist,
     root_group_glob: GroupGlob,
-) -> GroupNetlistWithConnections:
-    # Remove all root pins from the other pins.
-    def remove_root_pins(group: GroupWithConnection) -> GroupWithConnection:
-        group.pins = {
-            pin: {
-                other_pin
-                for other_pin in other_pins
-                if not does_match_pattern(root_group_glob, other_pin.group_id)
+    simplify_pins: Set[GroupPinName],
+) -> Iterator[Dict[str, str]]:
+    """
+    Generate the csv rows of one root group after the other.
+    Only the nets of root groups are looked at so that the work is proportional to the root groups and their nets.
+    """
+    root_group_ids = sorted(root_group_glob.filter(netlist.groups))
+    set_count("root groups", len(root_group_ids))
+    root_pin_nets = _get_root_pin_nets(netlist, set(root_group_ids))
+    net_simplifier = _NetSimplifier(simplify_pins)
+    # A root pin never shows up as other pin of itself because it matches the root group glob.
+    # Therefore, all root pins of a net share the same other pins.
+    other_pins_strs: Dict[Tuple[GroupNet, GroupPinName | None], str] = dict()
+    for group_id in root_group_ids:
+        group = netlist.groups[group_id]
+        pin_names = list(group.pins)
+        pin_names.sort(key=_get_sort_key)
+        for pin_name in pin_names:
+            global_pin = GlobalGroupPinIdentifier(group_id, pin_name)
+            net = root_pin_nets.get(global_pin, GroupNet(frozenset()))
+            simplify_pin = net_simplifier.get_simplify_pin(net, global_pin)
+            if (net, simplify_pin) not in other_pins_strs:
+                other_pins: AbstractSet[GlobalGroupPinIdentifier] = net
+                if simplify_pin is not None:
+                    print(
+                        f"Warning: Simplifying the net of {len(net)} pins with {stringify_group_id(group_id)}/{pin_name} to {simplify_pin}",
+                        file=sys.stderr,
+                    )
+                    other_pins = {
+                        GlobalGroupPinIdentifier(SIMPLIFIED_GROUP_ID, simplify_pin)
+                    }
+                # Ignore connections from root groups to other root groups.
+                other_pins_list = [
+                    other_pin
+                    for other_pin in other_pins
+                    if not root_group_glob.matches(other_pin.group_id)
+                ]
+                other_pins_list.sort()
+                other_pins_strs[(net, simplify_pin)] = "|".join([
+                    stringify_group_id(other_group_id) + "/" + other_pin
+                    for other_group_id, other_pin in other_pins_list
+                ])
+            other_pins_str = other_pins_strs[(net, simplify_pin)]
+            yield {
+                "schematic": group.schematic,
+                "group_path": group.path,
+                "group_type": group.group_type,
+                "pin_name": pin_name,
+                "other_pins": other_pins_str,
             }
-            for (pin, other_pins) in group.pins.items()
-        }
-        return group
-
-    # Remove all other groups.
-    netlist.groups = {
-        group_id: remove_root_pins(group)
-        for (group_id, group) in netlist.groups.items()
-        if does_match_pattern(root_group_glob, group_id)
-    }
-    return netlist
+
+
+def _write_rows(rows: Iterable[Dict[str, str]], output_file: TextIO) -> None:
+    csv_writer = csv.DictWriter(
+        output_file,
+        delimiter=",",
+        quotechar='"',
+        fieldnames=["schematic", "group_path", "group_type", "pin_name", "other_pins"],
+        quoting=csv.QUOTE_MINIMAL,
+    )
+    csv_writer.writeheader()
+    # Write each row as soon as it is generated.
+    for row in rows:
+        csv_writer.writerow(row)
+
+
+def _write_csv(rows: Iterable[Dict[str, str]], output_path: Path | None) -> None:
+    if output_path is None:
+        _write_rows(rows, sys.stdout)
+        return
+    print(f"Printing output to: {output_path}")
+    with (
+        open_output_if_changed(output_path) as binary_file,
+        io.TextIOWrapper(binary_file) as output_file,
+    ):
+        _write_rows(rows, output_file)
 
 
 def create_csv_from_netlist(
@@ -107,52 +216,24 @@ def create_csv_from_netlist(
     root_group_glob: GroupGlob,
     simplify_pins: Set[GroupPinName],
     output_path: Path | None,
+    verify: VerifyPolicy = VerifyPolicy.hash,
+    parse_cache: bool = False,
+    parse_cache_dir: Path | None = None,
 ) -> None:
     """
     This function does the same and has the same parameters as the netlist_to_csv CLI interface.
     """
 
-    netlist = connect_netlist(parse_group_netlist(group_netlist_path))
-    simple_netlist = _simplify_nets(netlist, simplify_pins)
-    simple_root_focus_netlist = _focus_on_root(simple_netlist, root_group_glob)
+    with span("parse"):
+        group_netlist = parse_group_netlist(
+            group_netlist_path, verify, parse_cache, parse_cache_dir
+        )
+    count_netlist(group_netlist.groups, group_netlist.nets)
 
-    output_file: TextIO
-    if output_path is not None:
-        print(f"Printing output to: {output_path}")
-        # We can't use with because we might print to stdout.
-        output_file = open(output_path, "w")
-    else:
-        output_file = sys.stdout
-
-    csv_writer = csv.DictWriter(
-        output_file,
-        delimiter=",",
-        quotechar='"',
-        fieldnames=["schematic", "group_path", "group_type", "pin_name", "other_pins"],
-        quoting=csv.QUOTE_MINIMAL,
-    )
-    csv_writer.writeheader()
-    group_ids = list(simple_root_focus_netlist.groups.keys())
-    group_ids.sort()
-    for group_id in group_ids:
-        group = simple_root_focus_netlist.groups[group_id]
-        pins = list(group.pins.items())
-        pins.sort(key=lambda p: _get_sort_key(p[0]))
-        for pin_name, other_pins in pins:
-            other_pins_list = list(other_pins)
-            other_pins_list.sort()
-            other_pins_str = "|".join([
-                stringify_group_id(other_group_id) + "/" + other_pin
-                for other_group_id, other_pin in other_pins_list
-            ])
-            csv_writer.writerow({
-                "schematic": group.schematic,
-                "group_path": group.path,
-                "group_type": group.group_type,
-                "pin_name": pin_name,
-                "other_pins": other_pins_str,
-            })
-    output_file.close()
+    with span("write"):
+        _write_csv(
+            _generate_rows(group_netlist, root_group_glob, simplify_pins), output_path
+        )
 
 
 def main() -> None:
@@ -181,7 +262,39 @@ def main() -> None:
         "--output",
         help="The output path. Print to stdout if not provided.",
     )
+    parser.add_argument(
+        "--verify",
+        help=VERIFY_POLICY_HELP,
+        type=VerifyPolicy,
+        choices=list(VerifyPolicy),
+        default=VerifyPolicy.hash,
+    )
+    parser.add_argument(
+        "--parse-cache",
+        help=PARSE_CACHE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--parse-cache-dir",
+        help=PARSE_CACHE_DIR_HELP,
+    )
+    parser.add_argument(
+        "--profile",
+        help=PROFILE_HELP,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats-json",
+        help=STATS_JSON_HELP,
+    )
+    parser.add_argument(
+        "--profile-memory",
+        help=PROFILE_MEMORY_HELP,
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.profile or args.stats_json is not None or args.profile_memory:
+        enable_instrumentation(args.profile_memory)
 
     simplify_pins: Set[GroupPinName] = {
         assert_is_pin_name(pin)
@@ -199,6 +312,13 @@ def main() -> None:
         root_group_glob,
         simplify_pins,
         None if args.output is None else Path(args.output),
+        args.verify,
+        args.parse_cache or args.parse_cache_dir is not None,
+        None if args.parse_cache_dir is None else Path(args.parse_cache_dir),
+    )
+    report_instrumentation(
+        args.profile or args.profile_memory,
+        None if args.stats_json is None else Path(args.stats_json),
     )
 
 